@@ -0,0 +1,59 @@
+import argparse
+import sys
+from datetime import date, timedelta
+
+import psycopg2
+
+DEFAULT_KEEP_DAYS = 365
+PARTITIONS_AHEAD_DAYS = 366
+
+
+def archive(db, returned_before, log=print):
+    with db.connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT ensure_subscription_partitions(%s)", (date.today() + timedelta(days=PARTITIONS_AHEAD_DAYS),))
+                created = cursor.fetchone()[0]
+                cursor.execute("SELECT archive_returned_loans(%s)", (returned_before,))
+                moved = cursor.fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    with db.connection() as conn:
+        old_autocommit = conn.autocommit
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("ANALYZE subscriptions")
+                cursor.execute("ANALYZE subscriptions_archive")
+        finally:
+            conn.autocommit = old_autocommit
+    db.mark_tables_changed("subscriptions")
+    log(f"Создано секций: {created}, перенесено в архив выдач: {moved}")
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перенос давно возвращенных выдач в subscriptions_archive и создание будущих секций.")
+    parser.add_argument("--keep-days", type=int, default=DEFAULT_KEEP_DAYS,
+                        help="оставлять в subscriptions выдачи, возвращенные за последние N дней")
+    args = parser.parse_args(argv)
+
+    from db_manager import DatabaseManager
+    db = DatabaseManager()
+    if not db.is_connected():
+        return 1
+    try:
+        archive(db, date.today() - timedelta(days=args.keep_days))
+    except psycopg2.Error as e:
+        print(f"Ошибка архивации: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
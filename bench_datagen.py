@@ -0,0 +1,213 @@
+import argparse
+import csv
+import io
+import itertools
+import random
+import sys
+from datetime import date, timedelta
+
+from psycopg2 import sql
+
+FIRST_NAMES = ["Александр", "Мария", "Дмитрий", "Анна", "Сергей", "Елена", "Андрей", "Ольга", "Иван", "Наталья",
+               "Михаил", "Татьяна", "Алексей", "Ирина", "Николай", "Светлана", "Павел", "Юлия", "Егор", "Ксения"]
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков",
+              "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров", "Павлов", "Козлов",
+              "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин", "Захаров"]
+TITLE_WORDS = ["Тайна", "Путь", "Город", "Ночь", "Море", "История", "Сад", "Время", "Дорога", "Огонь", "Песня",
+               "Зима", "Дом", "Мастер", "Звезда", "Тень", "Остров", "Книга", "Свет", "Память"]
+THEMES = ["Фантастика", "Детектив", "Роман", "История", "Наука", "Поэзия", "Детская литература", "Биография",
+          "Философия", "Психология", "Экономика", "Программирование", "Медицина", "Искусство", "Путешествия"]
+PUBLISHERS = ["Эксмо", "АСТ", "Азбука", "Росмэн", "Питер", "Наука", "Просвещение", "МИФ", "Альпина", "Дрофа"]
+CITIES = ["Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань", "Нижний Новгород", "Самара"]
+POSITIONS = ["Библиотекарь", "Старший библиотекарь", "Заведующий отделом", "Администратор", "Архивариус"]
+
+LOAD_ORDER = ["libraries", "themes", "books", "readers", "subscriptions", "employees"]
+COPY_CHUNK_ROWS = 50000
+
+
+class Scale:
+    def __init__(self, books):
+        self.books = books
+        self.libraries = max(3, min(200, books // 5000))
+        self.themes = len(THEMES)
+        self.authors = max(10, books // 10)
+        self.readers = max(10, books // 2)
+        self.subscriptions = books * 3
+        self.employees = self.libraries * 15
+
+
+def zipf_weights(n, s=1.1):
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def person_name(rng):
+    return f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}"
+
+
+def gen_libraries(rng, scale):
+    for i in range(1, scale.libraries + 1):
+        city = CITIES[i % len(CITIES)]
+        yield (f"Библиотека №{i}", f"г. {city}, ул. Центральная, д. {i}", f"+7495{i:07d}")
+
+
+def gen_themes(rng, scale):
+    for name in THEMES[:scale.themes]:
+        yield (name,)
+
+
+def gen_books(rng, scale, loans_per_book):
+    authors = [f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)[0]}. ({i})" for i in range(scale.authors)]
+    author_weights = zipf_weights(len(authors))
+    this_year = date.today().year
+    for book_id in range(1, scale.books + 1):
+        author = rng.choices(authors, cum_weights=author_weights)[0]
+        title = f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS).lower()} {book_id}"
+        theme_id = rng.randint(1, scale.themes) if rng.random() > 0.05 else None
+        yield (rng.randint(1, scale.libraries), theme_id, author, title, rng.choice(PUBLISHERS),
+               rng.choice(CITIES), rng.randint(1900, this_year), rng.randint(0, 5), loans_per_book.get(book_id, 0))
+
+
+def gen_readers(rng, scale):
+    for i in range(1, scale.readers + 1):
+        yield (person_name(rng), f"г. {rng.choice(CITIES)}, ул. Садовая, д. {rng.randint(1, 200)}", f"+7900{i:07d}")
+
+
+def plan_subscriptions(rng, scale):
+    book_weights = zipf_weights(scale.books, s=0.8)
+    book_order = list(range(1, scale.books + 1))
+    rng.shuffle(book_order)
+    today = date.today()
+    open_loans = {}
+    loans = []
+    for _ in range(scale.subscriptions):
+        book_id = book_order[rng.choices(range(scale.books), cum_weights=book_weights)[0]]
+        give_date = today - timedelta(days=int(rng.expovariate(1 / 300)) % 1500)
+        roll = rng.random()
+        if roll < 0.85:
+            return_date = min(today, give_date + timedelta(days=rng.randint(1, 60)))
+        else:
+            return_date = None
+            if roll > 0.97:
+                give_date = today - timedelta(days=rng.randint(90, 720))
+            open_loans[book_id] = open_loans.get(book_id, 0) + 1
+        prepayment = rng.choice([0, 0, 0, 100, 200, 500])
+        loans.append((book_id, rng.randint(1, scale.readers), give_date, return_date, prepayment))
+    return loans, open_loans
+
+
+def gen_employees(rng, scale):
+    for _ in range(scale.employees):
+        hire_date = date.today() - timedelta(days=rng.randint(0, 7000))
+        yield (rng.randint(1, scale.libraries), person_name(rng), rng.choice(POSITIONS), hire_date)
+
+
+COLUMNS = {
+    "libraries": ["name", "address", "phone"],
+    "themes": ["theme_name"],
+    "books": ["library_id", "theme_id", "author", "title", "publisher", "publish_place", "publish_year", "quantity", "on_loan"],
+    "readers": ["full_name", "address", "phone"],
+    "subscriptions": ["book_id", "reader_id", "give_date", "return_date", "prepayment"],
+    "employees": ["library_id", "full_name", "position", "hire_date"],
+}
+
+
+def copy_rows(cursor, table, columns, rows):
+    query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table), sql.SQL(', ').join(sql.Identifier(c) for c in columns))
+    query = query.as_string(cursor)
+    total = 0
+    while True:
+        chunk = list(itertools.islice(rows, COPY_CHUNK_ROWS))
+        if not chunk:
+            return total
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(chunk)
+        buffer.seek(0)
+        cursor.copy_expert(query, buffer)
+        total += len(chunk)
+
+
+def function_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM pg_proc WHERE proname = %s", (name,))
+    return cursor.fetchone() is not None
+
+
+def generate(db, books, seed=1, log=print):
+    rng = random.Random(seed)
+    scale = Scale(books)
+    loans, open_loans = plan_subscriptions(rng, scale)
+    generators = {
+        "libraries": gen_libraries(rng, scale),
+        "themes": gen_themes(rng, scale),
+        "books": gen_books(rng, scale, open_loans),
+        "readers": gen_readers(rng, scale),
+        "subscriptions": iter(loans),
+        "employees": gen_employees(rng, scale),
+    }
+
+    has_on_loan = "on_loan" in db.schema.columns("books")
+    with db.connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL library.moving_loans = on")
+                cursor.execute(sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE").format(
+                    sql.SQL(', ').join(sql.Identifier(t) for t in LOAD_ORDER)))
+                for table in LOAD_ORDER:
+                    cursor.execute(sql.SQL("ALTER TABLE {} DISABLE TRIGGER USER").format(sql.Identifier(table)))
+
+                for table in LOAD_ORDER:
+                    columns = COLUMNS[table]
+                    rows = generators[table]
+                    if table == "books" and not has_on_loan:
+                        columns = columns[:-1]
+                        rows = (row[:-1] for row in rows)
+                    count = copy_rows(cursor, table, columns, rows)
+                    log(f"{table}: {count}")
+
+                for table in LOAD_ORDER:
+                    cursor.execute(sql.SQL("ALTER TABLE {} ENABLE TRIGGER USER").format(sql.Identifier(table)))
+                for function in ("refresh_report_summaries", "refresh_search_vectors", "refresh_overdue_tracking"):
+                    if function_exists(cursor, function):
+                        cursor.execute(f"SELECT {function}()")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    with db.connection() as conn:
+        old_autocommit = conn.autocommit
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                for table in LOAD_ORDER:
+                    cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+        finally:
+            conn.autocommit = old_autocommit
+    db.mark_tables_changed(*LOAD_ORDER)
+    return scale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Заполнение базы синтетическими данными. Все таблицы очищаются!")
+    parser.add_argument("--books", type=int, default=100000, help="число книг; остальные таблицы масштабируются от него")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--wipe", action="store_true", help="подтверждение: существующие данные будут удалены")
+    args = parser.parse_args(argv)
+    if not args.wipe:
+        print("Генератор очищает все таблицы. Запустите с --wipe, если база одноразовая.", file=sys.stderr)
+        return 1
+
+    from db_manager import DatabaseManager
+    db = DatabaseManager()
+    if not db.is_connected():
+        return 1
+    db.schema.load()
+    try:
+        generate(db, args.books, args.seed)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
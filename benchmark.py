@@ -0,0 +1,258 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+
+import bench_datagen
+from bulk_io import MANAGED_TABLES
+from catalogue_search import SEARCH_TABLES, build_search_query
+from report_engine import (build_overdue_books_query, build_reader_overdue_query, POPULAR_AUTHORS_QUERY,
+                           build_library_activity_query)
+from gui_table_view import PAGE_SIZE, build_like_condition, build_page_query
+from lookup_cache import build_lookup_query
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ITERATIONS = 20
+REGRESSION_THRESHOLD = 0.2
+STARTUP_TARGET_MS = 200
+
+
+class TempCluster:
+    def __init__(self):
+        self.data_dir = None
+        self.port = None
+        self.started = False
+
+    def __enter__(self):
+        for tool in ("initdb", "pg_ctl", "psql"):
+            if not shutil.which(tool):
+                raise RuntimeError(f"Не найден {tool}: для --temp-cluster нужны программы PostgreSQL в PATH")
+        self.data_dir = tempfile.mkdtemp(prefix="library_bench_")
+        try:
+            self.setup()
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+
+    def setup(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        subprocess.run(["initdb", "-D", self.data_dir, "-U", "bench", "--auth=trust", "-E", "UTF8"],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run(["pg_ctl", "-D", self.data_dir, "-w", "-l", os.path.join(self.data_dir, "server.log"),
+                        "-o", f"-p {self.port} -k {self.data_dir} -c listen_addresses=127.0.0.1", "start"],
+                       check=True, stdout=subprocess.DEVNULL)
+        self.started = True
+        self.psql("postgres", "-c", "CREATE DATABASE library")
+        self.psql("library", "-f", os.path.join(BASE_DIR, "bd.sql"))
+        for path in sorted(glob.glob(os.path.join(BASE_DIR, "migrations", "*.sql"))):
+            self.psql("library", "-f", path)
+
+    def psql(self, database, *args):
+        subprocess.run(["psql", "-X", "-q", "-v", "ON_ERROR_STOP=1", "-h", "127.0.0.1", "-p", str(self.port),
+                        "-U", "bench", "-d", database, *args], check=True, stdout=subprocess.DEVNULL)
+
+    @property
+    def params(self):
+        return {'database': 'library', 'user': 'bench', 'host': '127.0.0.1', 'port': str(self.port)}
+
+    def __exit__(self, *exc):
+        if self.started:
+            subprocess.run(["pg_ctl", "-D", self.data_dir, "-m", "fast", "stop"], stdout=subprocess.DEVNULL)
+            self.started = False
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(func, iterations):
+    func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50': percentile(timings, 50),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'max': max(timings),
+        'mean': statistics.fmean(timings),
+        'peak_kb': peak / 1024,
+    }
+
+
+def consume(db, query, params):
+    def run():
+        for _ in db.stream_query(query, params):
+            pass
+    return run
+
+
+def fetch_all(db, query, params):
+    return lambda: db.execute_query(query, params, fetch="all", prepared=True)
+
+
+def benchmark_cases(db, term):
+    cases = {}
+    for table in MANAGED_TABLES:
+        columns = db.get_column_names(table)
+        pk = columns[0]
+        search_col = columns[1] if len(columns) > 1 else pk
+        cases[f"table_view.{table}.first_page"] = consume(db, *build_page_query(table, pk, pk, "ASC", [], []))
+        last_pk = db.execute_query(f"SELECT {pk} FROM {table} ORDER BY {pk} OFFSET 1000 LIMIT 1", fetch="one")
+        if last_pk:
+            cases[f"table_view.{table}.next_page"] = consume(db, *build_page_query(table, pk, pk, "ASC", [], [], (None, last_pk[0])))
+        cases[f"table_view.{table}.sorted"] = consume(db, *build_page_query(table, pk, search_col, "DESC", [], []))
+        cases[f"table_view.{table}.search"] = consume(
+            db, *build_page_query(table, pk, pk, "ASC", [build_like_condition(search_col)], [f"%{term}%"]))
+
+    for table in MANAGED_TABLES:
+        for col, (ref_table, ref_pk, display_col) in db.schema.foreign_keys(table).items():
+            cases[f"fk_lookup.{table}.{col}.list"] = fetch_all(db, *build_lookup_query(ref_table, ref_pk, display_col))
+            cases[f"fk_lookup.{table}.{col}.search"] = fetch_all(db, *build_lookup_query(ref_table, ref_pk, display_col, term))
+
+    for table in SEARCH_TABLES:
+        columns = db.schema.columns(table)
+        cases[f"search.{table}.ranked"] = consume(db, *build_search_query(table, columns, term, PAGE_SIZE))
+        cases[f"search.{table}.ranked.next_page"] = consume(db, *build_search_query(table, columns, term, PAGE_SIZE, PAGE_SIZE))
+
+    cases["report.overdue_books"] = consume(db, *build_overdue_books_query({'reader_name': '', 'sort_by': "Дням просрочки"}))
+    cases["report.overdue_books.by_reader"] = consume(db, *build_overdue_books_query({'reader_name': term, 'sort_by': "ФИО читателя"}))
+    cases["report.popular_authors"] = consume(db, POPULAR_AUTHORS_QUERY, (date.today() - timedelta(days=365), date.today()))
+    cases["report.reader_overdue"] = consume(db, build_reader_overdue_query({'sort_by': "Книгам в просрочке"}), None)
+    cases["report.library_activity"] = consume(db, build_library_activity_query({'sort_by': "Книг на руках"}), None)
+
+    def crud_round_trip(prepared):
+        def run():
+            row = db.execute_query("INSERT INTO readers (full_name, address) VALUES (%s, %s) RETURNING reader_id",
+                                   ("Тестовый Читатель", "бенчмарк"), fetch="one", prepared=prepared)
+            db.execute_query("UPDATE readers SET address = %s WHERE reader_id = %s", ("бенчмарк 2", row[0]), prepared=prepared)
+            db.execute_query("DELETE FROM readers WHERE reader_id = %s", (row[0],), prepared=prepared)
+        return run
+
+    cases["crud.readers.round_trip"] = crud_round_trip(False)
+    cases["crud.readers.round_trip.prepared"] = crud_round_trip(True)
+    return cases
+
+
+def run(db, iterations, term, only=None):
+    results = {}
+    for name, func in benchmark_cases(db, term).items():
+        if only and not any(part in name for part in only):
+            continue
+        results[name] = measure(func, iterations)
+        r = results[name]
+        print(f"{name:<48} p50={r['p50']:8.2f} мс  p95={r['p95']:8.2f} мс  p99={r['p99']:8.2f} мс  пик={r['peak_kb']:8.0f} КБ")
+    return results
+
+
+def measure_startup(runs, target=STARTUP_TARGET_MS):
+    window_ms = []
+    process_ms = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.join(BASE_DIR, "main.py"), "--startup-time"],
+                                capture_output=True, text=True)
+        elapsed = (time.perf_counter() - started) * 1000
+        marks = [line for line in result.stdout.splitlines() if line.startswith("STARTUP_MS=")]
+        if result.returncode or not marks:
+            print(f"Не удалось запустить приложение: {result.stderr.strip()}", file=sys.stderr)
+            return 2
+        window_ms.append(float(marks[-1].split("=", 1)[1]))
+        process_ms.append(elapsed)
+
+    window_p50 = percentile(window_ms, 50)
+    print(f"{'Окно показано (от запуска main.py)':<48} p50={window_p50:8.2f} мс  p95={percentile(window_ms, 95):8.2f} мс")
+    print(f"{'Процесс целиком (с интерпретатором)':<48} p50={percentile(process_ms, 50):8.2f} мс  "
+          f"p95={percentile(process_ms, 95):8.2f} мс")
+    if window_p50 > target:
+        print(f"Запуск медленнее цели {target} мс", file=sys.stderr)
+        return 1
+    return 0
+
+
+def compare(baseline, current, threshold):
+    regressions = 0
+    print(f"\nСравнение с эталоном (порог {threshold:.0%} по p95):")
+    for name, result in current.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        change = (result['p95'] - old['p95']) / old['p95'] if old['p95'] else 0
+        mark = ""
+        if change > threshold:
+            mark = "  <-- РЕГРЕССИЯ"
+            regressions += 1
+        print(f"{name:<48} {old['p95']:8.2f} -> {result['p95']:8.2f} мс ({change:+.0%}){mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры горячих путей приложения на синтетических данных.")
+    parser.add_argument("--temp-cluster", action="store_true", help="поднять одноразовый кластер PostgreSQL (initdb/pg_ctl)")
+    parser.add_argument("--generate", type=int, metavar="BOOKS", help="сгенерировать данные (очищает таблицы!)")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--term", default="ов", help="строка для поисковых запросов")
+    parser.add_argument("--only", nargs="*", help="запускать только кейсы, в имени которых есть эти подстроки")
+    parser.add_argument("--save", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON с прошлым запуском для поиска регрессий")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--startup", type=int, nargs="?", const=10, metavar="RUNS",
+                        help=f"замерить время до показа главного окна (цель {STARTUP_TARGET_MS} мс), без базы данных")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        return measure_startup(args.startup)
+
+    from db_manager import DatabaseManager
+    with ExitStack() as stack:
+        cluster = stack.enter_context(TempCluster()) if args.temp_cluster else None
+        db = DatabaseManager(cluster.params if cluster else None)
+        stack.callback(db.close)
+        if not db.is_connected():
+            return 2
+        db.schema.load()
+        books = args.generate or (100000 if cluster else None)
+        if books:
+            started = time.perf_counter()
+            bench_datagen.generate(db, books)
+            print(f"Данные сгенерированы за {time.perf_counter() - started:.1f} с\n")
+        results = run(db, args.iterations, args.term, args.only)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': datetime.now().isoformat(), 'iterations': args.iterations, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        if compare(baseline, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import argparse
+import csv
+import io
+import sys
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import psycopg2
+from psycopg2 import errors, sql
+
+MANAGED_TABLES = ["libraries", "themes", "books", "readers", "subscriptions", "employees"]
+CHUNK_ROWS = 50000
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y')
+ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError, errors.RaiseException)
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.duplicates = 0
+        self.errors = []
+
+    def add_error(self, line_no, message):
+        self.errors.append((line_no, message))
+
+    def summary(self):
+        return f"Добавлено: {self.inserted}, дубликатов пропущено: {self.duplicates}, строк с ошибками: {len(self.errors)}"
+
+
+def load_table_info(db, table):
+    schema = db.schema.table(table)
+    if schema is None:
+        raise ValueError(f"Не удалось получить структуру таблицы '{table}'")
+    columns = {name: (info['data_type'], info['not_null'], info['has_default'], info['max_length'])
+               for name, info in schema.column_info.items() if name in schema.columns}
+    return columns, dict(schema.references), list(schema.checks), list(schema.primary_key)
+
+
+def convert_value(value, data_type, max_length):
+    if data_type in ('integer', 'bigint', 'smallint'):
+        try:
+            return str(int(value))
+        except ValueError:
+            raise ValueError(f"'{value}' не является целым числом")
+    if data_type == 'numeric':
+        try:
+            return str(Decimal(value.replace(',', '.')))
+        except InvalidOperation:
+            raise ValueError(f"'{value}' не является числом")
+    if data_type == 'date':
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+            except ValueError:
+                pass
+        raise ValueError(f"'{value}' не является датой")
+    if max_length and len(value) > max_length:
+        raise ValueError(f"длина больше {max_length} символов")
+    return value
+
+
+def validate_row(row, header, columns):
+    if len(row) != len(header):
+        raise ValueError(f"ожидалось полей: {len(header)}, получено: {len(row)}")
+    values = []
+    for col, raw in zip(header, row):
+        data_type, not_null, has_default, max_length = columns[col]
+        raw = raw.strip()
+        if not raw:
+            if not_null:
+                raise ValueError(f"поле '{col}' обязательно для заполнения")
+            values.append(None)
+            continue
+        try:
+            values.append(convert_value(raw, data_type, max_length))
+        except ValueError as e:
+            raise ValueError(f"поле '{col}': {e}")
+    return values
+
+
+def copy_chunk(cursor, staging, header, buffer):
+    buffer.seek(0)
+    copy_sql = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(staging),
+        sql.SQL(', ').join(sql.Identifier(c) for c in ['line_no'] + header))
+    cursor.copy_expert(copy_sql.as_string(cursor), buffer)
+
+
+def reject_lines(cursor, staging, result, condition, message):
+    query = sql.SQL("DELETE FROM {} s WHERE {} RETURNING s.line_no").format(sql.Identifier(staging), condition)
+    cursor.execute(query)
+    for (line_no,) in cursor.fetchall():
+        result.add_error(line_no, message)
+
+
+def insert_staged(cursor, table, staging, header, result, staged):
+    cols = sql.SQL(', ').join(sql.Identifier(c) for c in header)
+    insert = sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} s {} ON CONFLICT DO NOTHING")
+    cursor.execute("SAVEPOINT import_batch")
+    try:
+        cursor.execute(insert.format(sql.Identifier(table), cols, cols, sql.Identifier(staging), sql.SQL("ORDER BY line_no")))
+        result.inserted = cursor.rowcount
+        result.duplicates = staged - cursor.rowcount
+        cursor.execute("RELEASE SAVEPOINT import_batch")
+        return
+    except ROW_ERRORS:
+        cursor.execute("ROLLBACK TO SAVEPOINT import_batch")
+
+    cursor.execute(sql.SQL("CREATE INDEX ON {} (line_no)").format(sql.Identifier(staging)))
+    cursor.execute(sql.SQL("SELECT line_no FROM {} ORDER BY line_no").format(sql.Identifier(staging)))
+    row_insert = insert.format(sql.Identifier(table), cols, cols, sql.Identifier(staging), sql.SQL("WHERE s.line_no = %s"))
+    for (line_no,) in cursor.fetchall():
+        cursor.execute("SAVEPOINT import_row")
+        try:
+            cursor.execute(row_insert, (line_no,))
+        except ROW_ERRORS as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+            result.add_error(line_no, e.diag.message_primary or str(e).strip())
+            continue
+        cursor.execute("RELEASE SAVEPOINT import_row")
+        if cursor.rowcount:
+            result.inserted += 1
+        else:
+            result.duplicates += 1
+
+
+def sync_sequence(cursor, table, primary_key, header):
+    if len(primary_key) != 1 or primary_key[0] not in header:
+        return
+    cursor.execute(sql.SQL("SELECT setval(seq, GREATEST(m, COALESCE(pg_sequence_last_value(seq), 0))) "
+                           "FROM (SELECT pg_get_serial_sequence(%s, %s)::regclass AS seq, (SELECT max({}) FROM {}) AS m) s "
+                           "WHERE seq IS NOT NULL AND m IS NOT NULL").format(
+        sql.Identifier(primary_key[0]), sql.Identifier(table)), (table, primary_key[0]))
+
+
+def import_csv(db, table, file, delimiter=','):
+    if table not in MANAGED_TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+
+    result = ImportResult()
+    reader = csv.reader(file, delimiter=delimiter)
+    header = [h.strip() for h in next(reader, [])]
+    staging = f"import_{table}"
+    columns, foreign_keys, checks, primary_key = load_table_info(db, table)
+    unknown = [c for c in header if c not in columns]
+    if not header or unknown:
+        raise ValueError(f"Неизвестные столбцы в заголовке: {', '.join(unknown) or '(пусто)'}")
+    missing = [c for c, (_, not_null, has_default, _) in columns.items()
+               if not_null and not has_default and c not in header]
+    if missing:
+        raise ValueError(f"В файле нет обязательных столбцов: {', '.join(missing)}")
+
+    with db.connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+                    sql.Identifier(staging),
+                    sql.SQL(', ').join(sql.Identifier(c) for c in header),
+                    sql.Identifier(table)))
+                cursor.execute(sql.SQL("ALTER TABLE {} ADD COLUMN line_no INT").format(sql.Identifier(staging)))
+
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                buffered = 0
+                for line_no, row in enumerate(reader, start=2):
+                    if not any(field.strip() for field in row):
+                        continue
+                    try:
+                        writer.writerow([line_no] + validate_row(row, header, columns))
+                        buffered += 1
+                    except ValueError as e:
+                        result.add_error(line_no, str(e))
+                    if buffered >= CHUNK_ROWS:
+                        copy_chunk(cursor, staging, header, buffer)
+                        buffer = io.StringIO()
+                        writer = csv.writer(buffer)
+                        buffered = 0
+                if buffered:
+                    copy_chunk(cursor, staging, header, buffer)
+
+                for col, (ref_table, ref_col) in foreign_keys.items():
+                    if col not in header:
+                        continue
+                    condition = sql.SQL("s.{col} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {ref} r WHERE r.{ref_col} = s.{col})").format(
+                        col=sql.Identifier(col), ref=sql.Identifier(ref_table), ref_col=sql.Identifier(ref_col))
+                    reject_lines(cursor, staging, result, condition, f"поле '{col}': нет записи в таблице {ref_table}")
+
+                for name, definition, check_columns in checks:
+                    if not set(check_columns) <= set(header) or not definition.startswith('CHECK '):
+                        continue
+                    condition = sql.SQL("NOT {}").format(sql.SQL(definition[len('CHECK '):]))
+                    reject_lines(cursor, staging, result, condition, f"нарушено ограничение {name}")
+
+                cursor.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(staging)))
+                staged = cursor.fetchone()[0]
+                insert_staged(cursor, table, staging, header, result, staged)
+                sync_sequence(cursor, table, primary_key, header)
+            conn.commit()
+            db.mark_tables_changed(table)
+        except Exception:
+            conn.rollback()
+            raise
+
+    result.errors.sort()
+    return result
+
+
+def export_csv(db, table, file, delimiter=','):
+    if table not in MANAGED_TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    columns = db.schema.columns(table)
+    if not columns:
+        raise ValueError(f"Не удалось получить структуру таблицы '{table}'")
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            query = sql.SQL("COPY (SELECT {} FROM {} ORDER BY 1) TO STDOUT WITH (FORMAT csv, HEADER, DELIMITER {})").format(
+                sql.SQL(', ').join(sql.Identifier(c) for c in columns), sql.Identifier(table), sql.Literal(delimiter))
+            cursor.copy_expert(query.as_string(cursor), file)
+        conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Массовый импорт и экспорт таблиц библиотеки в CSV.")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("table", choices=MANAGED_TABLES)
+    parser.add_argument("file", help="путь к CSV-файлу ('-' для stdin/stdout)")
+    parser.add_argument("--delimiter", default=",")
+    args = parser.parse_args(argv)
+
+    from db_manager import DatabaseManager
+    db = DatabaseManager()
+    if not db.is_connected():
+        return 1
+    db.schema.load()
+    try:
+        if args.action == "import":
+            if args.file == "-":
+                result = import_csv(db, args.table, sys.stdin, args.delimiter)
+            else:
+                with open(args.file, newline='', encoding='utf-8') as f:
+                    result = import_csv(db, args.table, f, args.delimiter)
+            for line_no, message in result.errors:
+                print(f"строка {line_no}: {message}", file=sys.stderr)
+            print(result.summary())
+        else:
+            if args.file == "-":
+                export_csv(db, args.table, sys.stdout, args.delimiter)
+            else:
+                with open(args.file, 'w', newline='', encoding='utf-8') as f:
+                    export_csv(db, args.table, f, args.delimiter)
+    except (ValueError, OSError, psycopg2.Error) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import re
+
+from psycopg2 import sql
+
+SEARCH_CONFIG = 'russian'
+SEARCH_TABLES = {
+    'books': ('book_id', ['author', 'title']),
+    'readers': ('reader_id', ['full_name']),
+}
+
+
+def build_tsquery(text):
+    words = re.findall(r'\w+', text.lower())
+    return ' & '.join(f"{word}:*" for word in words)
+
+
+def build_search_query(table, columns, text, limit=None, offset=0):
+    if table not in SEARCH_TABLES:
+        return None
+    tsquery = build_tsquery(text)
+    if not tsquery:
+        return None
+    pk, fuzzy_columns = SEARCH_TABLES[table]
+    term = text.strip()
+
+    fuzzy_match = sql.SQL(" OR ").join(sql.SQL("%s <%% {}").format(sql.Identifier('t', col)) for col in fuzzy_columns)
+    similarity = sql.SQL(", ").join(sql.SQL("word_similarity(%s, {})").format(sql.Identifier('t', col))
+                                    for col in fuzzy_columns)
+    query = sql.SQL("SELECT {select} FROM {table} t, to_tsquery({config}, %s) q "
+                    "WHERE t.search_vector @@ q OR {fuzzy_match} "
+                    "ORDER BY ts_rank(t.search_vector, q) + greatest({similarity}) DESC, {pk}").format(
+        select=sql.SQL(", ").join(sql.Identifier('t', col) for col in columns),
+        table=sql.Identifier(table),
+        config=sql.Literal(SEARCH_CONFIG),
+        fuzzy_match=fuzzy_match,
+        similarity=similarity,
+        pk=sql.Identifier('t', pk))
+    params = [tsquery] + [term] * len(fuzzy_columns) * 2
+    if limit is not None:
+        query += sql.SQL(" LIMIT %s OFFSET %s")
+        params.extend([limit, offset])
+    return query, tuple(params)
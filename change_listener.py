@@ -0,0 +1,119 @@
+import itertools
+import json
+import queue
+import select
+import threading
+
+import psycopg2
+
+from bulk_io import MANAGED_TABLES
+
+CHANNEL = 'library_changes'
+SELECT_TIMEOUT = 1.0
+RECONNECT_DELAY = 5.0
+DISPATCH_INTERVAL_MS = 200
+
+
+class ChangeListener:
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self.events = queue.Queue()
+        self.subscribers = {}
+        self.tokens = itertools.count(1)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.widget = None
+
+    def start(self, widget=None):
+        if self.thread and self.thread.is_alive():
+            return
+        self.widget = widget
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="change-listener", daemon=True)
+        self.thread.start()
+        if widget is not None:
+            widget.after(DISPATCH_INTERVAL_MS, self.dispatch)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=SELECT_TIMEOUT * 2)
+            self.thread = None
+
+    def run(self):
+        connected_before = False
+        while not self.stop_event.is_set():
+            try:
+                conn = psycopg2.connect(**self.db.params)
+            except psycopg2.Error as e:
+                print(f"Не удалось подключиться для получения уведомлений: {e}")
+                self.stop_event.wait(RECONNECT_DELAY)
+                continue
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                if connected_before:
+                    self.publish(None, None)
+                connected_before = True
+                self.listen(conn)
+            except psycopg2.Error as e:
+                print(f"Соединение для уведомлений потеряно: {e}")
+                self.stop_event.wait(RECONNECT_DELAY)
+            finally:
+                conn.close()
+
+    def listen(self, conn):
+        while not self.stop_event.is_set():
+            self.db.schema.refresh_if_due()
+            if select.select([conn], [], [], SELECT_TIMEOUT) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    payload = json.loads(notify.payload)
+                except ValueError:
+                    continue
+                self.publish(payload.get('table'), payload.get('ids'))
+
+    def publish(self, table, ids):
+        tables = [table] if table else MANAGED_TABLES
+        self.db.mark_tables_changed(*tables)
+        for name in tables:
+            self.db.lookups.invalidate(name)
+        if self.widget is not None:
+            self.events.put((table, ids))
+
+    def subscribe(self, tables, callback):
+        token = next(self.tokens)
+        self.subscribers[token] = (set(tables), callback)
+        return token
+
+    def unsubscribe(self, token):
+        self.subscribers.pop(token, None)
+
+    def dispatch(self):
+        changes = {}
+        reload_all = False
+        while True:
+            try:
+                table, ids = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if table is None:
+                reload_all = True
+            elif ids is None or changes.get(table, set()) is None:
+                changes[table] = None
+            else:
+                changes.setdefault(table, set()).update(str(i) for i in ids)
+
+        for tables, callback in list(self.subscribers.values()):
+            for table in tables:
+                if reload_all or table in changes:
+                    try:
+                        callback(table, None if reload_all else changes[table])
+                    except Exception as e:
+                        print(f"Ошибка обработки уведомления об изменении {table}: {e}")
+        if not self.stop_event.is_set():
+            self.widget.after(DISPATCH_INTERVAL_MS, self.dispatch)
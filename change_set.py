@@ -0,0 +1,144 @@
+import itertools
+import time
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+from query_log import estimate_size
+
+BATCH_PAGE_SIZE = 500
+
+
+class ChangeSet:
+    def __init__(self):
+        self.inserts = {}
+        self.updates = {}
+        self.deletes = set()
+        self.originals = {}
+        self.temp_ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.inserts) + len(self.updates) + len(self.deletes)
+
+    def remember(self, record_id, values):
+        if record_id not in self.inserts:
+            self.originals.setdefault(record_id, values)
+
+    def add_insert(self, data):
+        temp_id = f"new-{next(self.temp_ids)}"
+        self.inserts[temp_id] = dict(data)
+        return temp_id
+
+    def add_update(self, record_id, data):
+        if record_id in self.deletes:
+            return False
+        if record_id in self.inserts:
+            self.inserts[record_id].update(data)
+        else:
+            self.updates.setdefault(record_id, {}).update(data)
+        return True
+
+    def add_delete(self, record_id):
+        if self.inserts.pop(record_id, None) is not None:
+            return
+        self.updates.pop(record_id, None)
+        self.deletes.add(record_id)
+
+
+class ChangeResult:
+    def __init__(self):
+        self.inserted = {}
+        self.updated = {}
+        self.deleted = []
+
+    def summary(self):
+        return f"добавлено: {len(self.inserted)}, изменено: {len(self.updated)}, удалено: {len(self.deleted)}"
+
+
+def group_by_columns(items):
+    groups = {}
+    for key, data in items:
+        groups.setdefault(tuple(data), []).append((key, data))
+    return groups
+
+
+def insert_values(schema, data):
+    return {c: v for c, v in data.items() if v is not None or not schema.column_info[c]['has_default']}
+
+
+def build_insert_query(table, cols, returning):
+    if not cols:
+        return sql.SQL("INSERT INTO {} AS t DEFAULT VALUES RETURNING {}").format(sql.Identifier(table), returning)
+    return sql.SQL("INSERT INTO {} AS t ({}) VALUES ({}) RETURNING {}").format(
+        sql.Identifier(table), sql.SQL(', ').join(sql.Identifier(c) for c in cols),
+        sql.SQL(', ').join([sql.Placeholder()] * len(cols)), returning)
+
+
+def execute_logged(db, cursor, task, query, params):
+    text = query if isinstance(query, str) else query.as_string(cursor)
+    started = time.perf_counter()
+    try:
+        db.statements.execute(cursor, text, params)
+        rows = cursor.fetchall()
+    except psycopg2.Error as e:
+        db.log_query(text, params, started, task, error=str(e).strip())
+        raise
+    db.log_query(text, params, started, task, len(rows), estimate_size(rows))
+    return rows
+
+
+def execute_rows(db, cursor, task, query, rows, template):
+    text = query.as_string(cursor)
+    single = text.replace("VALUES %s", f"VALUES {template}", 1)
+    if len(rows) == 1:
+        return execute_logged(db, cursor, task, single, rows[0])
+    started = time.perf_counter()
+    try:
+        result = execute_values(cursor, text, rows, template=template, page_size=BATCH_PAGE_SIZE, fetch=True)
+    except psycopg2.Error as e:
+        db.log_query(single, rows[0], started, task, error=str(e).strip())
+        raise
+    db.log_query(single, rows[0], started, task, len(result), estimate_size(result))
+    return result
+
+
+def apply_change_set(db, table, columns, schema, changes, task=None):
+    pk = columns[0]
+    pk_type = schema.data_type(pk)
+    result = ChangeResult()
+    returning = sql.SQL(', ').join(sql.SQL("t.{}").format(sql.Identifier(c)) for c in columns)
+
+    with db.connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                if changes.deletes:
+                    rows = execute_logged(db, cursor, task, sql.SQL("DELETE FROM {} WHERE {} = ANY(%s::{}[]) RETURNING {}").format(
+                        sql.Identifier(table), sql.Identifier(pk), sql.SQL(pk_type), sql.Identifier(pk)),
+                        (list(changes.deletes),))
+                    result.deleted = [str(row[0]) for row in rows]
+
+                for cols, items in group_by_columns(changes.updates.items()).items():
+                    template = "(" + ", ".join(f"%s::{schema.data_type(c)}" for c in (pk,) + cols) + ")"
+                    query = sql.SQL("UPDATE {} t SET {} FROM (VALUES %s) AS v({}) WHERE t.{} = v.{} RETURNING {}").format(
+                        sql.Identifier(table),
+                        sql.SQL(', ').join(sql.SQL("{} = v.{}").format(sql.Identifier(c), sql.Identifier(c)) for c in cols),
+                        sql.SQL(', ').join(sql.Identifier(c) for c in (pk,) + cols),
+                        sql.Identifier(pk), sql.Identifier(pk), returning)
+                    rows = execute_rows(db, cursor, task, query, [[record_id] + [data[c] for c in cols] for record_id, data in items],
+                                        template)
+                    for row in rows:
+                        result.updated[str(row[0])] = row
+
+                for temp_id, data in changes.inserts.items():
+                    data = insert_values(schema, data)
+                    rows = execute_logged(db, cursor, task, build_insert_query(table, list(data), returning), list(data.values()))
+                    result.inserted[temp_id] = rows[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    db.mark_tables_changed(table)
+    db.lookups.invalidate(table)
+    return result
@@ -4,4 +4,20 @@ DB_PARAMS = {
     'password': 'student',
     'host': 'localhost',
     'port': '5433'
-}
\ No newline at end of file
+}
+
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 8
+HEALTH_CHECK_INTERVAL = 30
+STREAM_ITERSIZE = 2000
+
+QUERY_LOG_SIZE = 1000
+SLOW_QUERY_MS = 500
+QUERY_LOG_FILE = None
+
+SCHEMA_CACHE_FILE = '.schema_cache.json'
+
+MAX_PREPARED_STATEMENTS = 100
+
+REPLICA_CACHE_FILE = None
+REPLICA_MAX_STALENESS = 300
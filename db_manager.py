@@ -1,42 +1,264 @@
+import itertools
+import queue
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
 import psycopg2
-from psycopg2 import sql
-from db_config import DB_PARAMS
+from psycopg2 import extensions, pool, sql
+from db_config import (DB_PARAMS, POOL_MIN_CONN, POOL_MAX_CONN, HEALTH_CHECK_INTERVAL, STREAM_ITERSIZE,
+                       QUERY_LOG_SIZE, SLOW_QUERY_MS, QUERY_LOG_FILE, SCHEMA_CACHE_FILE, MAX_PREPARED_STATEMENTS,
+                       REPLICA_CACHE_FILE, REPLICA_MAX_STALENESS)
+from change_listener import ChangeListener
+from lookup_cache import LookupCache
+from query_log import QueryLog, describe_caller, estimate_size
+from replica_cache import ReplicaCache
+from schema_cache import SchemaCache
+from statement_registry import StatementRegistry
+
+WRITE_TABLE_RE = re.compile(r'^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)"?', re.IGNORECASE)
+FIRST_WORD_RE = re.compile(r'^[\s(]*(\w+)')
+EXPLAINABLE_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+PLAN_QUEUE_SIZE = 16
 
 class DatabaseManager:
-    def __init__(self):
-        self.conn = None
+    def __init__(self, params=None):
+        self.params = params or DB_PARAMS
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(POOL_MAX_CONN)
+        self.last_used = {}
+        self.cursor_ids = itertools.count(1)
+        self.lookups = LookupCache(self)
+        self.table_versions = defaultdict(int)
+        self.versions_lock = threading.Lock()
+        self.query_log = QueryLog(QUERY_LOG_SIZE, SLOW_QUERY_MS, QUERY_LOG_FILE)
+        self.plan_queue = queue.Queue(maxsize=PLAN_QUEUE_SIZE)
+        threading.Thread(target=self.capture_plans, name="explain", daemon=True).start()
+        self.schema = SchemaCache(self, SCHEMA_CACHE_FILE)
+        self.statements = StatementRegistry(MAX_PREPARED_STATEMENTS)
+        self.listener = ChangeListener(self)
+        self.replica = ReplicaCache(self, REPLICA_CACHE_FILE, REPLICA_MAX_STALENESS) if REPLICA_CACHE_FILE else None
         self.connect()
 
     def connect(self):
-        try:
-            self.conn = psycopg2.connect(**DB_PARAMS)
-        except psycopg2.OperationalError as e:
-            print(f"Ошибка подключения к базе данных: {e}")
-            self.conn = None
+        with self.pool_lock:
+            if self.pool:
+                return True
+            try:
+                self.pool = pool.ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN, **self.params)
+            except psycopg2.OperationalError as e:
+                print(f"Ошибка подключения к базе данных: {e}")
+                self.pool = None
+            return self.pool is not None
+
+    def is_connected(self):
+        return self.pool is not None
 
     def close(self):
-        if self.conn:
-            self.conn.close()
+        self.listener.stop()
+        with self.pool_lock:
+            if self.pool:
+                self.pool.closeall()
+                self.pool = None
+            self.last_used.clear()
+        if self.replica:
+            self.replica.close()
 
-    def execute_query(self, query, params=None, fetch=None):
-        if not self.conn:
-            print("Нет соединения с базой данных.")
-            return None
-        
-        with self.conn.cursor() as cursor:
+    def is_healthy(self, conn):
+        if conn.closed or conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - self.last_used.get(id(conn), 0) < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        if not self.pool and not self.connect():
+            raise psycopg2.OperationalError("пул соединений не создан")
+        self.slots.acquire()
+        try:
+            for _ in range(POOL_MAX_CONN + 1):
+                conn = self.pool.getconn()
+                if self.is_healthy(conn):
+                    return conn
+                self.last_used.pop(id(conn), None)
+                self.pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError("Не удалось получить рабочее соединение из пула.")
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        try:
+            if self.pool:
+                if not close and not conn.closed and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        close = True
+                close = close or bool(conn.closed)
+                if close:
+                    self.last_used.pop(id(conn), None)
+                else:
+                    self.last_used[id(conn)] = time.monotonic()
+                self.pool.putconn(conn, close=close)
+            else:
+                conn.close()
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def execute_query(self, query, params=None, fetch=None, task=None, prepared=False):
+        for attempt in range(2):
+            if task and task.cancelled:
+                return None
             try:
-                cursor.execute(query, params)
-                if fetch == "one":
-                    return cursor.fetchone()
-                if fetch == "all":
-                    return cursor.fetchall()
-                self.conn.commit()
-                return True # Для INSERT, UPDATE, DELETE
+                conn = self.getconn()
+            except psycopg2.Error as e:
+                print(f"Нет соединения с базой данных: {e}")
+                return None
+
+            committing = False
+            if task:
+                task.attach(conn)
+            text = query if isinstance(query, str) else query.as_string(conn)
+            started = time.perf_counter()
+            try:
+                with conn.cursor() as cursor:
+                    if prepared:
+                        self.statements.execute(cursor, text, params)
+                    else:
+                        cursor.execute(query, params)
+                    if fetch == "one":
+                        result = cursor.fetchone()
+                        fetched = [result] if result else []
+                    elif fetch == "all":
+                        result = cursor.fetchall()
+                        fetched = result
+                    else:
+                        result = True # Для INSERT, UPDATE, DELETE
+                        fetched = None
+                    row_count = len(fetched) if fetched is not None else cursor.rowcount
+                committing = True
+                conn.commit()
+                self.track_write(text)
+                self.log_query(text, params, started, task, row_count, estimate_size(fetched or []))
+                return result
             except psycopg2.Error as e:
-                self.conn.rollback()
-                print(f"Ошибка выполнения запроса: {e}")
+                self.log_query(text, params, started, task, error=str(e).strip())
+                if conn.closed:
+                    print(f"Соединение с базой данных потеряно: {e}")
+                    if attempt == 0 and not committing:
+                        continue
+                    return None
+                conn.rollback()
+                if not (task and task.cancelled and isinstance(e, extensions.QueryCanceledError)):
+                    print(f"Ошибка выполнения запроса: {e}")
                 return None
+            finally:
+                if task:
+                    task.detach()
+                self.putconn(conn)
+
+    def log_query(self, text, params, started, task, rows=None, size=0, error=None):
+        caller = task.caller if task and task.caller else describe_caller()
+        record = self.query_log.record(text, caller, started, rows, size, error)
+        match = FIRST_WORD_RE.match(text)
+        if self.query_log.is_slow(record) and match and match.group(1).upper() in EXPLAINABLE_STATEMENTS:
+            self.queue_plan(record, text, params)
+
+    def queue_plan(self, record, text, params):
+        try:
+            self.plan_queue.put_nowait((record, text, params))
+        except queue.Full:
+            record.plan = "План не получен: очередь EXPLAIN переполнена"
+
+    def capture_plans(self):
+        while True:
+            self.capture_plan(*self.plan_queue.get())
+
+    def capture_plan(self, record, text, params):
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("EXPLAIN " + text, params)
+                    record.plan = "\n".join(row[0] for row in cursor.fetchall())
+                conn.rollback()
+        except psycopg2.Error as e:
+            record.plan = f"Не удалось получить план: {e}"
+
+    def track_write(self, text):
+        match = WRITE_TABLE_RE.match(text)
+        if match:
+            self.mark_tables_changed(match.group(1).lower())
+
+    def mark_tables_changed(self, *tables):
+        with self.versions_lock:
+            for table in tables:
+                self.table_versions[table] += 1
+        if self.replica:
+            self.replica.invalidate(tables)
+
+    def get_table_versions(self, tables):
+        with self.versions_lock:
+            return tuple(self.table_versions[table] for table in tables)
+
+    def stream_query(self, query, params=None, itersize=None, task=None):
+        itersize = itersize or STREAM_ITERSIZE
+        conn = self.getconn()
+        if task:
+            task.attach(conn)
+        text = query if isinstance(query, str) else query.as_string(conn)
+        started = time.perf_counter()
+        row_count = size = 0
+        try:
+            with conn.cursor(name=f"stream_{next(self.cursor_ids)}") as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                while not (task and task.cancelled):
+                    rows = cursor.fetchmany(itersize)
+                    if not rows:
+                        break
+                    row_count += len(rows)
+                    size += estimate_size(rows)
+                    yield rows
+            conn.commit()
+            self.log_query(text, params, started, task, row_count, size)
+        except psycopg2.Error as e:
+            self.log_query(text, params, started, task, row_count, size, str(e).strip())
+            if not conn.closed:
+                conn.rollback()
+            if task and task.cancelled and isinstance(e, extensions.QueryCanceledError):
+                return
+            print(f"Ошибка выполнения запроса: {e}")
+            raise
+        finally:
+            if task:
+                task.detach()
+            self.putconn(conn)
 
     def get_column_names(self, table_name):
-        query = sql.SQL("SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position")
-        return [row[0] for row in self.execute_query(query, (table_name,), fetch="all")]
\ No newline at end of file
+        return self.schema.columns(table_name)
+
+    def estimate_row_count(self, query, params=None, task=None):
+        explain = "EXPLAIN (FORMAT JSON) "
+        query = explain + query if isinstance(query, str) else sql.SQL(explain) + query
+        plan = self.execute_query(query, params, fetch="one", task=task)
+        if not plan:
+            return None
+        return int(plan[0][0]['Plan']['Plan Rows'])
\ No newline at end of file
@@ -0,0 +1,108 @@
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+
+from report_engine import report_cache
+
+TOP_N = 50
+
+
+class DiagnosticsWindow(tk.Toplevel):
+    def __init__(self, parent, db_manager):
+        super().__init__(parent)
+        self.db = db_manager
+        self.title("Диагностика запросов")
+        self.geometry("1000x600")
+
+        top_frame = ttk.Frame(self)
+        top_frame.pack(fill=tk.X, padx=10, pady=5)
+        self.summary_var = tk.StringVar()
+        ttk.Label(top_frame, textvariable=self.summary_var, anchor='w').pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(top_frame, text="Очистить", command=self.clear).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(top_frame, text="Обновить", command=self.refresh).pack(side=tk.RIGHT, padx=5)
+
+        paned = ttk.PanedWindow(self, orient=tk.VERTICAL)
+        paned.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
+
+        notebook = ttk.Notebook(paned)
+        self.slow_tree = self.create_tree(notebook, [("duration", "Время, мс", 90), ("rows", "Строк", 70),
+                                                     ("bytes", "Байт", 80), ("caller", "Источник", 180),
+                                                     ("started", "Начало", 140), ("statement", "Запрос", 500)])
+        notebook.add(self.slow_tree.master, text="Самые медленные")
+        self.frequent_tree = self.create_tree(notebook, [("count", "Вызовов", 70), ("avg", "Среднее, мс", 90),
+                                                         ("max", "Макс., мс", 90), ("total", "Всего, мс", 90),
+                                                         ("caller", "Источники", 200), ("statement", "Запрос", 500)])
+        notebook.add(self.frequent_tree.master, text="Самые частые")
+        paned.add(notebook, weight=3)
+
+        plan_frame = ttk.LabelFrame(paned, text="Запрос и план выполнения")
+        self.plan_text = tk.Text(plan_frame, height=10, wrap='none')
+        self.plan_text.pack(expand=True, fill=tk.BOTH)
+        paned.add(plan_frame, weight=1)
+
+        self.slow_tree.bind('<<TreeviewSelect>>', self.show_plan)
+        self.slow_records = {}
+        self.refresh()
+
+    def create_tree(self, parent, columns):
+        frame = ttk.Frame(parent)
+        tree = ttk.Treeview(frame, columns=[c[0] for c in columns], show='headings')
+        for name, text, width in columns:
+            tree.heading(name, text=text)
+            tree.column(name, width=width, stretch=(name == "statement"))
+        tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        vsb = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        vsb.pack(side='right', fill='y')
+        tree.configure(yscrollcommand=vsb.set)
+        return tree
+
+    def refresh(self):
+        log = self.db.query_log
+        for tree in (self.slow_tree, self.frequent_tree):
+            for item in tree.get_children():
+                tree.delete(item)
+
+        self.slow_records = {}
+        for i, record in enumerate(log.slowest(TOP_N)):
+            started = datetime.fromtimestamp(record.started_at).strftime('%H:%M:%S')
+            statement = record.statement if not record.error else f"[ОШИБКА] {record.statement}"
+            self.slow_tree.insert('', 'end', iid=str(i), values=[f"{record.duration_ms:.1f}", record.rows if record.rows is not None else "",
+                                                              record.bytes, record.caller, started, statement])
+            self.slow_records[str(i)] = record
+
+        for statement, stats in log.most_frequent(TOP_N):
+            self.frequent_tree.insert('', 'end', values=[stats['count'], f"{stats['total_ms'] / stats['count']:.1f}",
+                                                         f"{stats['max_ms']:.1f}", f"{stats['total_ms']:.1f}",
+                                                         ", ".join(sorted(stats['callers'])), statement])
+
+        cache = report_cache.stats()
+        prepared = self.db.statements.stats()
+        self.summary_var.set(f"Записей в журнале: {len(log.records)} (порог медленного запроса {log.slow_ms} мс). "
+                             f"Кэш отчетов: попаданий {cache['hits']}, промахов {cache['misses']}, записей {cache['entries']}. "
+                             f"Подготовленные запросы: {prepared['statements']}, PREPARE {prepared['prepares']}, "
+                             f"выполнений {prepared['executions']}, без PREPARE {prepared['unprepared']}")
+        if self.db.replica:
+            replica = self.db.replica.stats()
+            self.summary_var.set(self.summary_var.get() + f". Локальная копия: попаданий {replica['hits']}, "
+                                 f"промахов {replica['misses']}, страниц {replica['pages']}")
+
+    def show_plan(self, event=None):
+        selected = self.slow_tree.selection()
+        if not selected:
+            return
+        record = self.slow_records.get(selected[0])
+        self.plan_text.delete('1.0', tk.END)
+        if record is None:
+            return
+        text = record.statement
+        if record.error:
+            text += f"\n\nОшибка: {record.error}"
+        if record.plan:
+            text += f"\n\n{record.plan}"
+        elif self.db.query_log.is_slow(record):
+            text += "\n\nПлан еще не получен, нажмите «Обновить»."
+        self.plan_text.insert('1.0', text)
+
+    def clear(self):
+        self.db.query_log.clear()
+        self.refresh()
\ No newline at end of file
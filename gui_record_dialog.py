@@ -1,8 +1,74 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+from bulk_io import convert_value
+from lookup_cache import format_choice
+from query_runner import QueryRunner
+
+SEARCH_DELAY_MS = 300
+
+class SearchCombobox(ttk.Combobox):
+    def __init__(self, parent, lookups, table, pk, display_col, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.lookups = lookups
+        self.table = table
+        self.pk = pk
+        self.display_col = display_col
+        self.choices_map = {}
+        self.choices_reverse_map = {}
+        self.runner = QueryRunner(self)
+        self.search_job = None
+        self.search_task = None
+        self.bind('<KeyRelease>', self.on_key_release)
+        self.search("")
+
+    def set_choices(self, rows):
+        if rows is None or isinstance(rows, Exception):
+            return
+        for record_id, name in rows:
+            self.choices_map[format_choice(record_id, name)] = record_id
+            self.choices_reverse_map[record_id] = format_choice(record_id, name)
+        self['values'] = [format_choice(record_id, name) for record_id, name in rows]
+
+    def on_key_release(self, event):
+        if event.keysym in ('Up', 'Down', 'Return', 'Tab', 'Escape'):
+            return
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY_MS, lambda: self.search(self.get()))
+
+    def search(self, text):
+        self.search_job = None
+        if text in self.choices_map:
+            return
+        if self.search_task:
+            self.search_task.cancel()
+        self.search_task = self.runner.submit(
+            lambda task: self.lookups.search(self.table, self.pk, self.display_col, text, task=task),
+            self.set_choices)
+
+    def set_value(self, record_id):
+        name = self.lookups.cached_label(self.table, self.pk, self.display_col, record_id)
+        if name is not None:
+            self.show_label(record_id, name)
+            return
+        self.choices_map[str(record_id)] = record_id
+        self.set(str(record_id))
+        self.runner.submit(
+            lambda task: self.lookups.get_label(self.table, self.pk, self.display_col, record_id, task=task),
+            lambda name: self.on_label(record_id, name))
+
+    def on_label(self, record_id, name):
+        if name is not None and self.get() == str(record_id):
+            self.show_label(record_id, name)
+
+    def show_label(self, record_id, name):
+        self.choices_map[format_choice(record_id, name)] = record_id
+        self.choices_reverse_map[record_id] = format_choice(record_id, name)
+        self.set(format_choice(record_id, name))
+
 
 class RecordDialog(tk.Toplevel):
-    def __init__(self, parent, title, columns, db_manager, foreign_keys={}, initial_data=None):
+    def __init__(self, parent, title, columns, db_manager, foreign_keys={}, initial_data=None, table_schema=None, bulk=False):
         super().__init__(parent)
         self.transient(parent)
         self.title(title)
@@ -10,10 +76,15 @@ class RecordDialog(tk.Toplevel):
         self.foreign_keys = foreign_keys
         self.columns = columns
         self.initial_data = initial_data
+        self.table_schema = table_schema
+        self.bulk = bulk
 
         self.result = None
         self.entries = {}
 
+        if self.bulk:
+            ttk.Label(self, text="Пустые поля останутся без изменений.", padding=(10, 10, 10, 0)).pack(anchor='w')
+
         form_frame = ttk.Frame(self, padding="10")
         form_frame.pack(expand=True, fill=tk.BOTH)
 
@@ -35,18 +106,14 @@ class RecordDialog(tk.Toplevel):
 
     def create_form(self, parent_frame):
         for i, col in enumerate(self.columns):
-            ttk.Label(parent_frame, text=col.replace('_', ' ').title()).grid(row=i, column=0, padx=5, pady=5, sticky='w')
+            label = col.replace('_', ' ').title()
+            if self.is_required(col):
+                label += " *"
+            ttk.Label(parent_frame, text=label).grid(row=i, column=0, padx=5, pady=5, sticky='w')
             
             if col in self.foreign_keys:
                 table, pk, display_col = self.foreign_keys[col]
-                query = f"SELECT {pk}, {display_col} FROM {table} ORDER BY {display_col}"
-                choices_data = self.db.execute_query(query, fetch="all")
-                
-                entry = ttk.Combobox(parent_frame, state="readonly")
-                if choices_data:
-                    entry['values'] = [f"{name} ({id})" for id, name in choices_data]
-                    entry.choices_map = {f"{name} ({id})": id for id, name in choices_data}
-                    entry.choices_reverse_map = {id: f"{name} ({id})" for id, name in choices_data}
+                entry = SearchCombobox(parent_frame, self.db.lookups, table, pk, display_col)
                 self.entries[col] = entry
             else:
                 entry = ttk.Entry(parent_frame)
@@ -56,16 +123,28 @@ class RecordDialog(tk.Toplevel):
         
         parent_frame.grid_columnconfigure(1, weight=1)
 
+    def column_info(self, col):
+        if self.table_schema:
+            return self.table_schema.column_info.get(col)
+        return None
+
+    def is_required(self, col):
+        if self.bulk:
+            return False
+        info = self.column_info(col)
+        if info is None:
+            return col in self.foreign_keys
+        return info['not_null'] and not info['has_default']
+
     def populate_form(self):
         for col, value in self.initial_data.items():
             if col not in self.entries: continue
             
             entry = self.entries[col]
             entry.config(state='normal')
-            if isinstance(entry, ttk.Combobox):
-                display_value = entry.choices_reverse_map.get(int(value))
-                if display_value:
-                    entry.set(display_value)
+            if isinstance(entry, SearchCombobox):
+                if value not in (None, ""):
+                    entry.set_value(int(value))
             else:
                 entry.insert(0, value if value is not None else "")
 
@@ -73,16 +152,33 @@ class RecordDialog(tk.Toplevel):
         data = {}
         for col, entry in self.entries.items():
             value = None
-            if isinstance(entry, ttk.Combobox):
+            if isinstance(entry, SearchCombobox):
                 value = entry.choices_map.get(entry.get())
             else:
                 value = entry.get()
             
-            if not value and col in self.foreign_keys:
-                messagebox.showwarning("Ошибка ввода", f"Поле '{col.title()}' обязательно для заполнения.")
-                return
-            
-            data[col] = value if value else None
+            if isinstance(value, str):
+                value = value.strip()
+            if value in (None, ""):
+                if self.bulk:
+                    continue
+                if self.is_required(col):
+                    messagebox.showwarning("Ошибка ввода", f"Поле '{col.title()}' обязательно для заполнения.", parent=self)
+                    return
+                data[col] = None
+                continue
+
+            info = self.column_info(col)
+            if info and isinstance(value, str):
+                try:
+                    value = convert_value(value, info['data_type'], info['max_length'])
+                except ValueError as e:
+                    messagebox.showwarning("Ошибка ввода", f"Поле '{col.title()}': {e}", parent=self)
+                    return
+            data[col] = value
 
+        if self.bulk and not data:
+            messagebox.showwarning("Ошибка ввода", "Заполните хотя бы одно поле.", parent=self)
+            return
         self.result = data
         self.destroy()
\ No newline at end of file
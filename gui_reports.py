@@ -1,6 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+from collections import defaultdict
 from datetime import datetime 
+from decimal import Decimal
+from query_runner import QueryRunner
+from report_engine import REPORTS, OVERDUE_SORTS, ACTIVITY_SORTS, READER_OVERDUE_SORTS, report_cache
+
+REPORT_REFRESH_DELAY_MS = 1000
 
 def center_window(win):
     win.update_idletasks()
@@ -51,35 +57,133 @@ class ReportDialog(tk.Toplevel):
 
 class ReportViewer(tk.Toplevel):
 
-    def __init__(self, parent, title, columns, data, totals=None):
+    def __init__(self, parent, title, columns, data=None, totals=None):
         super().__init__(parent)
         self.title(title)
         self.geometry("800x500")
+        self.runner = QueryRunner(self)
+        self.task = None
+
+        status_frame = ttk.Frame(self)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 5))
+        self.status_var = tk.StringVar()
+        ttk.Label(status_frame, textvariable=self.status_var, anchor='w').pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.refresh_button = ttk.Button(status_frame, text="Обновить", command=self.refresh)
+        self.cancel_button = ttk.Button(status_frame, text="Отмена", command=self.cancel)
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', length=120)
 
         tree_frame = ttk.Frame(self)
         tree_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
 
-        tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
         for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=120)
-        tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=120)
+        self.tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
 
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
         vsb.pack(side='right', fill='y')
-        tree.configure(yscrollcommand=vsb.set)
-        
+        self.tree.configure(yscrollcommand=vsb.set)
+
+        self.totals_frame = None
+        self.db = None
+        self.change_token = None
+        self.reload_job = None
+        if data is not None:
+            self.set_data(data, totals)
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        center_window(self)
+
+    def set_data(self, data, totals=None):
         for row in data:
-            tree.insert('', 'end', values=row)
+            self.tree.insert('', 'end', values=row)
+        self.set_totals(totals)
 
+    def set_totals(self, totals):
+        if self.totals_frame:
+            self.totals_frame.destroy()
+            self.totals_frame = None
         if totals:
-            totals_frame = ttk.LabelFrame(self, text="Итоги")
-            totals_frame.pack(fill=tk.X, padx=10, pady=5)
+            self.totals_frame = ttk.LabelFrame(self, text="Итоги")
+            self.totals_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5, before=self.tree.master)
             for key, value in totals.items():
-                ttk.Label(totals_frame, text=f"{key}: {value}").pack(anchor='w')
-
-
-        center_window(self)
+                ttk.Label(self.totals_frame, text=f"{key}: {value}").pack(anchor='w')
+
+    def start(self, fetch, make_totals=None, refresh=False):
+        self.fetch = fetch
+        self.make_totals = make_totals
+        self.row_count = 0
+        self.column_sums = defaultdict(int)
+        self.status_var.set("Выполняется запрос...")
+        self.refresh_button.pack_forget()
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        self.progress.pack(side=tk.RIGHT)
+        self.progress.start(10)
+        self.task = self.runner.submit_stream(lambda task: fetch(task, refresh), self.append_batch, self.on_done, self.on_error)
+
+    def refresh(self, force=True):
+        if self.task:
+            self.task.cancel()
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self.set_totals(None)
+        self.start(self.fetch, self.make_totals, refresh=force)
+
+    def watch(self, db, tables):
+        self.db = db
+        self.change_token = db.listener.subscribe(tables, self.on_tables_changed)
+
+    def on_tables_changed(self, table, ids):
+        if self.reload_job is None:
+            self.status_var.set("Данные изменились, отчет будет обновлен...")
+            self.reload_job = self.after(REPORT_REFRESH_DELAY_MS, self.reload_changed)
+
+    def reload_changed(self):
+        self.reload_job = None
+        self.refresh(force=False)
+
+    def stop_busy(self):
+        self.task = None
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.cancel_button.pack_forget()
+        self.refresh_button.pack(side=tk.RIGHT, padx=5)
+
+    def append_batch(self, rows):
+        for row in rows:
+            self.tree.insert('', 'end', values=row)
+            for i, value in enumerate(row):
+                if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                    self.column_sums[i] += value
+        self.row_count += len(rows)
+        self.status_var.set(f"Получено строк: {self.row_count}...")
+
+    def on_done(self, _):
+        self.stop_busy()
+        if self.make_totals:
+            self.set_totals(self.make_totals(self.row_count, self.column_sums))
+        stats = report_cache.stats()
+        self.status_var.set(f"Строк: {self.row_count}. Кэш отчетов: попаданий {stats['hits']}, промахов {stats['misses']}")
+
+    def on_error(self, error):
+        self.stop_busy()
+        self.status_var.set("Не удалось сформировать отчет.")
+
+    def cancel(self):
+        if self.task:
+            self.task.cancel()
+            self.stop_busy()
+            self.status_var.set("Запрос отменен.")
+
+    def on_close(self):
+        if self.task:
+            self.task.cancel()
+        if self.reload_job:
+            self.after_cancel(self.reload_job)
+        if self.change_token:
+            self.db.listener.unsubscribe(self.change_token)
+        self.destroy()
 
 
 class OverdueBooksDialog(ReportDialog):
@@ -91,7 +195,7 @@ class OverdueBooksDialog(ReportDialog):
         ttk.Label(self.form_frame, text="Сортировать по:").grid(row=1, column=0, sticky='w', padx=5)
         self.sort_var = tk.StringVar(value="Дням просрочки")
         self.sort_menu = ttk.Combobox(self.form_frame, textvariable=self.sort_var, 
-                                      values=["Дням просрочки", "ФИО читателя", "Названию книги"], state="readonly")
+                                      values=list(OVERDUE_SORTS), state="readonly")
         self.sort_menu.grid(row=1, column=1, pady=5)
 
     def on_ok(self):
@@ -102,6 +206,19 @@ class OverdueBooksDialog(ReportDialog):
         super().on_ok()
 
 
+class ReaderOverdueDialog(ReportDialog):
+    def create_widgets(self):
+        ttk.Label(self.form_frame, text="Сортировать по:").grid(row=0, column=0, sticky='w', padx=5)
+        self.sort_var = tk.StringVar(value="Книгам в просрочке")
+        self.sort_menu = ttk.Combobox(self.form_frame, textvariable=self.sort_var,
+                                      values=list(READER_OVERDUE_SORTS), state="readonly")
+        self.sort_menu.grid(row=0, column=1, pady=5)
+
+    def on_ok(self):
+        self.result = {'sort_by': self.sort_var.get()}
+        super().on_ok()
+
+
 class PopularAuthorsDialog(ReportDialog):
     def create_widgets(self):
         ttk.Label(self.form_frame, text="Дата выдачи от (ДД.ММ.ГГГГ):").grid(row=0, column=0, sticky='w', padx=5)
@@ -138,7 +255,7 @@ class LibraryActivityDialog(ReportDialog):
         ttk.Label(self.form_frame, text="Сортировать по:").grid(row=0, column=0, sticky='w', padx=5)
         self.sort_var = tk.StringVar(value="Книг на руках")
         self.sort_menu = ttk.Combobox(self.form_frame, textvariable=self.sort_var, 
-                                      values=["Названию библиотеки", "Всего книг", "Книг на руках", "Книг в наличии"], state="readonly")
+                                      values=list(ACTIVITY_SORTS), state="readonly")
         self.sort_menu.grid(row=0, column=1, pady=5)
 
     def on_ok(self):
@@ -146,64 +263,37 @@ class LibraryActivityDialog(ReportDialog):
         super().on_ok()
 
 
+def open_report(parent, db, name, params):
+    report = REPORTS[name]
+    viewer = ReportViewer(parent, report.title, report.columns)
+    viewer.watch(db, report.tables)
+    load, extra = report.loader(db, report.parse_params(params))
+    viewer.start(load, lambda count, sums: report.totals(count, sums, extra))
+
 def show_overdue_books_report(parent, db):
     dialog = OverdueBooksDialog(parent, "Отчет: Книги-должники")
     parent.wait_window(dialog)
     params = dialog.result
     if not params: return
-    query = """
-    SELECT r.full_name, b.title, s.give_date, (CURRENT_DATE - s.give_date) AS days_overdue
-    FROM subscriptions s
-    JOIN readers r ON s.reader_id = r.reader_id
-    JOIN books b ON s.book_id = b.book_id
-    WHERE s.return_date IS NULL AND (CURRENT_DATE - s.give_date) > 30
-    """
-    query_params = []
-    if params['reader_name']:
-        query += " AND r.full_name ILIKE %s"
-        query_params.append(f"%{params['reader_name']}%")
-    sort_map = {"Дням просрочки": 'days_overdue DESC', "ФИО читателя": 'r.full_name ASC', "Названию книги": 'b.title ASC'}
-    query += f" ORDER BY {sort_map.get(params['sort_by'], '4 DESC')}"
-    data = db.execute_query(query, tuple(query_params), fetch="all")
-    if data is None: return
-    totals = {"Всего книг в просрочке": len(data)}
-    ReportViewer(parent, "Отчет: Книги-должники", ["ФИО читателя", "Название книги", "Дата выдачи", "Дней на руках"], data, totals)
+    open_report(parent, db, 'overdue_books', params)
+
+def show_reader_overdue_report(parent, db):
+    dialog = ReaderOverdueDialog(parent, "Отчет: Читатели-должники")
+    parent.wait_window(dialog)
+    params = dialog.result
+    if not params: return
+    open_report(parent, db, 'reader_overdue', params)
 
 def show_popular_authors_report(parent, db):
     dialog = PopularAuthorsDialog(parent, "Отчет: Популярные авторы")
     parent.wait_window(dialog)
     params = dialog.result
     if not params: return
-    query = """
-    SELECT b.author, COUNT(s.sub_id) AS borrow_count
-    FROM subscriptions s JOIN books b ON s.book_id = b.book_id
-    WHERE s.give_date BETWEEN %s AND %s
-    GROUP BY b.author ORDER BY borrow_count DESC LIMIT 20;
-    """
-    data = db.execute_query(query, (params['start_date'], params['end_date']), fetch="all")
-    if data is None: return
-    totals = {"Всего выдач за период (топ 20 авторов)": sum(row[1] for row in data)}
-    ReportViewer(parent, "Отчет: Популярные авторы", ["Автор", "Количество выдач"], data, totals)
+    open_report(parent, db, 'popular_authors', params)
 
 def show_library_activity_report(parent, db):
     dialog = LibraryActivityDialog(parent, "Отчет: Активность библиотек")
     parent.wait_window(dialog)
     params = dialog.result
     if not params: return
-    query = """
-    SELECT l.name, SUM(b.quantity) + COUNT(s.sub_id) AS total_books, COUNT(s.sub_id) AS on_loan, SUM(b.quantity) AS available
-    FROM libraries l
-    LEFT JOIN books b ON l.library_id = b.library_id
-    LEFT JOIN subscriptions s ON b.book_id = s.book_id AND s.return_date IS NULL
-    GROUP BY l.name
-    """
-    sort_map = {"Названию библиотеки": 'l.name', "Всего книг": 'total_books DESC', "Книг на руках": 'on_loan DESC', "Книг в наличии": 'available DESC'}
-    query += f" ORDER BY {sort_map.get(params['sort_by'], '3 DESC')}"
-    data = db.execute_query(query, fetch="all")
-    if data is None: return
-    totals = {
-        "Всего книг": sum(row[1] for row in data if row[1]),
-        "Всего на руках": sum(row[2] for row in data if row[2]),
-        "Всего в наличии": sum(row[3] for row in data if row[3])
-    }
-    ReportViewer(parent, "Отчет: Активность библиотек", ["Библиотека", "Всего экз.", "На руках", "В наличии"], data, totals)
\ No newline at end of file
+    open_report(parent, db, 'library_activity', params)
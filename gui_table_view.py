@@ -1,7 +1,55 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+from psycopg2 import sql
 from db_manager import DatabaseManager
-from gui_record_dialog import RecordDialog
+import bulk_io
+from catalogue_search import SEARCH_TABLES, build_search_query
+from change_set import ChangeSet, apply_change_set
+from gui_record_dialog import RecordDialog, SEARCH_DELAY_MS
+from query_runner import QueryRunner
+from replica_cache import MIRRORED_TABLES, select_rows
+from result_model import ResultModel
+
+PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 200
+LOCAL_ROW_LIMIT = 50000
+GENERATED_COLUMNS = {'books': ['on_loan']}
+RANKED_SEARCH = "Везде (по релевантности)"
+
+def build_like_condition(column):
+    return sql.SQL("{}::text ILIKE %s").format(sql.Identifier(column))
+
+def build_page_query(table_name, pk, sort_col, order, conditions, params, last_key=None, limit=PAGE_SIZE, columns=None):
+    conditions, params = list(conditions), list(params)
+    op = sql.SQL('<' if order == "DESC" else '>')
+    direction = sql.SQL(order)
+    pk_id, sort_id = sql.Identifier(pk), sql.Identifier(sort_col)
+
+    if last_key is not None:
+        last_sort, last_pk = last_key
+        if sort_col == pk:
+            conditions.append(sql.SQL("{} {} %s").format(pk_id, op))
+            params.append(last_pk)
+        elif last_sort is None:
+            conditions.append(sql.SQL("{} IS NULL AND {} {} %s").format(sort_id, pk_id, op))
+            params.append(last_pk)
+        else:
+            conditions.append(sql.SQL("({sort} {op} %s OR ({sort} = %s AND {pk} {op} %s) OR {sort} IS NULL)").format(
+                sort=sort_id, pk=pk_id, op=op))
+            params.extend([last_sort, last_sort, last_pk])
+
+    selected = sql.SQL(', ').join(sql.Identifier(c) for c in columns) if columns else sql.SQL('*')
+    query = sql.SQL("SELECT {} FROM {}").format(selected, sql.Identifier(table_name))
+    if conditions:
+        query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+    if sort_col == pk:
+        query += sql.SQL(" ORDER BY {} {}").format(pk_id, direction)
+    else:
+        query += sql.SQL(" ORDER BY {} {} NULLS LAST, {} {}").format(sort_id, direction, pk_id, direction)
+    query += sql.SQL(" LIMIT %s")
+    params.append(limit)
+    return query, tuple(params)
+
 
 class TableView(tk.Toplevel):
     def __init__(self, parent, table_name, db_manager):
@@ -9,6 +57,8 @@ class TableView(tk.Toplevel):
         self.db = db_manager
         self.table_name = table_name
         self.columns = self.db.get_column_names(self.table_name)
+        self.changes = ChangeSet()
+        self.saving = False
 
         if not self.columns:
             messagebox.showerror("Ошибка получения данных", f"Не удалось получить структуру таблицы '{self.table_name}'.")
@@ -23,22 +73,47 @@ class TableView(tk.Toplevel):
 
         self.setup_filters(top_frame)
         self.setup_buttons(top_frame) 
+
+        self.setup_status_bar()
         
         self.tree_frame = ttk.Frame(self)
         self.tree_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
         
         self.tree = ttk.Treeview(self.tree_frame, columns=self.columns, show='headings')
         for col in self.columns:
-            self.tree.heading(col, text=col.replace('_', ' ').title())
+            self.tree.heading(col, text=col.replace('_', ' ').title(), command=lambda c=col: self.on_heading_click(c))
             self.tree.column(col, width=100)
         
+        self.tree.tag_configure('pending_insert', foreground='dark green')
+        self.tree.tag_configure('pending_update', foreground='blue')
+        self.tree.tag_configure('pending_delete', foreground='gray')
         self.tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
         
-        vsb = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
-        vsb.pack(side='right', fill='y')
-        self.tree.configure(yscrollcommand=vsb.set)
+        self.vsb = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
+        self.vsb.pack(side='right', fill='y')
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+
+        self.pk_col = self.columns[0]
+        self.last_key = None
+        self.has_more = False
+        self.loading = False
+        self.page_pending = False
+        self.fetched_count = 0
+        self.row_estimate = None
+        self.query_state = None
+        self.page_rows = 0
+        self.model = ResultModel(self.columns)
+        self.like_filter = None
+        self.local_sort = None
+        self.hidden = []
+
+        self.runner = QueryRunner(self)
+        self.page_task = None
+        self.estimate_task = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.foreign_keys = self.get_foreign_keys_info()
+        self.change_token = self.db.listener.subscribe([self.table_name], self.on_remote_change)
         self.load_data()
 
     def setup_filters(self, parent):
@@ -46,13 +121,18 @@ class TableView(tk.Toplevel):
         filter_frame.pack(fill=tk.X)
 
         ttk.Label(filter_frame, text="Поле для поиска:").grid(row=0, column=0, padx=5, pady=5)
-        default_search_col = self.columns[1] if len(self.columns) > 1 else self.columns[0]
-        self.search_col_var = tk.StringVar(value=default_search_col)
-        self.search_col_menu = ttk.Combobox(filter_frame, textvariable=self.search_col_var, values=self.columns)
+        search_columns = [RANKED_SEARCH] + self.columns if self.table_name in SEARCH_TABLES else self.columns
+        self.search_col_var = tk.StringVar(value=self.default_search_column())
+        self.search_col_menu = ttk.Combobox(filter_frame, textvariable=self.search_col_var, values=search_columns)
         self.search_col_menu.grid(row=0, column=1, padx=5, pady=5)
         self.search_entry = ttk.Entry(filter_frame)
         self.search_entry.grid(row=0, column=2, padx=5, pady=5)
+        self.search_entry.bind('<KeyRelease>', self.on_search_key)
+        self.search_entry.bind('<Return>', lambda e: self.load_data(like=True))
         ttk.Button(filter_frame, text="Поиск", command=lambda: self.load_data(like=True)).grid(row=0, column=3, padx=5)
+        self.live_search_var = tk.BooleanVar(value=self.table_name in SEARCH_TABLES)
+        ttk.Checkbutton(filter_frame, text="Искать при вводе", variable=self.live_search_var).grid(row=0, column=4, padx=5)
+        self.search_job = None
 
         ttk.Label(filter_frame, text="Сортировать по:").grid(row=1, column=0, padx=5, pady=5)
         self.sort_col_var = tk.StringVar(value=self.columns[0])
@@ -61,109 +141,550 @@ class TableView(tk.Toplevel):
         self.sort_order_var = tk.StringVar(value="ASC")
         self.sort_order_menu = ttk.Combobox(filter_frame, textvariable=self.sort_order_var, values=["ASC", "DESC"])
         self.sort_order_menu.grid(row=1, column=2, padx=5, pady=5)
-        ttk.Button(filter_frame, text="Применить", command=self.load_data).grid(row=1, column=3, padx=5)
+        ttk.Button(filter_frame, text="Применить", command=self.apply_sort).grid(row=1, column=3, padx=5)
         ttk.Button(filter_frame, text="Сбросить", command=self.reset_filters).grid(row=1, column=4, padx=5)
 
+        ttk.Label(filter_frame, text="Быстрый фильтр:").grid(row=2, column=0, padx=5, pady=5)
+        self.quick_filter_entry = ttk.Entry(filter_frame)
+        self.quick_filter_entry.grid(row=2, column=1, columnspan=2, sticky='ew', padx=5, pady=5)
+        self.quick_filter_entry.bind('<KeyRelease>', lambda e: self.apply_local_view())
+
     def setup_buttons(self, parent):
         button_frame = ttk.LabelFrame(parent, text="Действия")
         button_frame.pack(fill=tk.X, pady=(10,0))
         ttk.Button(button_frame, text="Добавить", command=self.open_add_dialog).pack(side=tk.LEFT, padx=5, pady=5)
         ttk.Button(button_frame, text="Изменить", command=self.open_edit_dialog).pack(side=tk.LEFT, padx=5, pady=5)
         ttk.Button(button_frame, text="Удалить", command=self.delete_record).pack(side=tk.LEFT, padx=5, pady=5)
+        self.batch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(button_frame, text="Пакетный режим", variable=self.batch_var,
+                        command=self.on_batch_toggle).pack(side=tk.LEFT, padx=(15, 5), pady=5)
+        self.apply_button = ttk.Button(button_frame, text="Применить", command=self.apply_changes, state='disabled')
+        self.apply_button.pack(side=tk.LEFT, padx=5, pady=5)
+        self.discard_button = ttk.Button(button_frame, text="Отменить изменения", command=self.discard_changes, state='disabled')
+        self.discard_button.pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(button_frame, text="Экспорт CSV", command=self.export_csv).pack(side=tk.RIGHT, padx=5, pady=5)
+        ttk.Button(button_frame, text="Импорт CSV", command=self.import_csv).pack(side=tk.RIGHT, padx=5, pady=5)
         
+    def setup_status_bar(self):
+        status_frame = ttk.Frame(self)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 5))
+        self.status_var = tk.StringVar()
+        ttk.Label(status_frame, textvariable=self.status_var, anchor='w').pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.cancel_button = ttk.Button(status_frame, text="Отмена", command=self.cancel_loading)
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', length=120)
+
+    def show_busy(self):
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        self.progress.pack(side=tk.RIGHT)
+        self.progress.start(10)
+
+    def hide_busy(self):
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.cancel_button.pack_forget()
+
+    def default_search_column(self):
+        if self.table_name in SEARCH_TABLES:
+            return RANKED_SEARCH
+        return self.columns[1] if len(self.columns) > 1 else self.columns[0]
+
+    def on_search_key(self, event):
+        if not self.live_search_var.get() or event.keysym in ('Return', 'Tab', 'Escape'):
+            return
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY_MS, self.run_live_search)
+
+    def run_live_search(self):
+        self.search_job = None
+        self.load_data(like=True)
+
     def get_foreign_keys_info(self):
-        if self.table_name == 'books':
-            return {'library_id': ('libraries', 'library_id', 'name'), 'theme_id': ('themes', 'theme_id', 'theme_name')}
-        elif self.table_name == 'subscriptions':
-            return {'book_id': ('books', 'book_id', 'title'), 'reader_id': ('readers', 'reader_id', 'full_name')}
-        elif self.table_name == 'employees':
-            return {'library_id': ('libraries', 'library_id', 'name')}
-        return {}
+        return self.db.schema.foreign_keys(self.table_name)
     
-    def load_data(self, like=False):
-        for i in self.tree.get_children(): self.tree.delete(i)
-        query = f"SELECT * FROM {self.table_name}"
-        params = []
+    def get_sort_column(self):
+        sort_col = self.sort_col_var.get()
+        return sort_col if sort_col in self.columns else self.pk_col
+
+    def get_sort_order(self):
+        return "DESC" if self.sort_order_var.get() == "DESC" else "ASC"
+
+    def get_like_filter(self):
         search_val = self.search_entry.get()
-        if search_val:
-            query += f" WHERE {self.search_col_var.get()}::text ILIKE %s"
-            params.append(f"%{search_val}%")
-        query += f" ORDER BY {self.sort_col_var.get()} {self.sort_order_var.get()}"
-        data = self.db.execute_query(query, tuple(params), fetch="all")
-        if data:
-            for row in data:
-                self.tree.insert('', 'end', values=[str(v) if v is not None else "" for v in row])
+        search_col = self.search_col_var.get()
+        if search_val and search_col in self.columns and search_col != RANKED_SEARCH:
+            return search_col, search_val
+        return None
+
+    def build_filter(self):
+        like = self.get_like_filter()
+        if not like:
+            return [], []
+        return [build_like_condition(like[0])], [f"%{like[1]}%"]
+
+    def get_ranked_search_text(self):
+        if self.search_col_var.get() != RANKED_SEARCH:
+            return None
+        text = self.search_entry.get().strip()
+        if build_search_query(self.table_name, self.columns, text) is None:
+            return None
+        return text
+
+    def build_page_query(self):
+        sort_col, order, conditions, params, search_text = self.query_state
+        if search_text:
+            return build_search_query(self.table_name, self.columns, search_text, PAGE_SIZE, self.fetched_count)
+        return build_page_query(self.table_name, self.pk_col, sort_col, order, conditions, params, self.last_key,
+                                columns=self.columns)
+
+    def load_data(self, like=False):
+        self.cancel_loading()
+        self.tree.delete(*self.tree.get_children(), *[iid for iid in self.hidden if self.tree.exists(iid)])
+        self.hidden = []
+        self.model.clear()
+        self.local_sort = None
+        self.show_pending_inserts()
+        self.last_key = None
+        self.has_more = True
+        self.fetched_count = 0
+        self.row_estimate = None
+
+        conditions, params = self.build_filter()
+        search_text = self.get_ranked_search_text()
+        self.query_state = (self.get_sort_column(), self.get_sort_order(), conditions, params, search_text)
+        self.like_filter = self.get_like_filter()
+        self.update_headings()
+
+        if search_text:
+            count_query, count_params = build_search_query(self.table_name, self.columns, search_text)
+        else:
+            count_query = sql.SQL("SELECT * FROM {}").format(sql.Identifier(self.table_name))
+            if conditions:
+                count_query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+            count_params = tuple(params)
+        if not (self.db.replica and self.table_name in MIRRORED_TABLES):
+            self.estimate_task = self.runner.submit(
+                lambda task: self.db.estimate_row_count(count_query, count_params, task=task),
+                self.on_row_estimate, self.on_row_estimate)
+        self.load_next_page()
+
+    def on_row_estimate(self, estimate):
+        self.estimate_task = None
+        if isinstance(estimate, int):
+            self.row_estimate = estimate
+        self.update_status()
+        self.load_rest_if_small()
+
+    def load_next_page(self):
+        self.page_pending = False
+        if self.loading or not self.has_more:
+            return
+        self.loading = True
+        self.page_rows = 0
+        query, params = self.build_page_query()
+        self.page_task = self.runner.submit_stream(self.page_fetcher(query, params),
+                                                   self.append_rows, self.on_page_loaded, self.on_page_failed)
+        self.show_busy()
+        self.update_status()
+
+    def page_fetcher(self, query, params):
+        sort_col, order, _, _, search_text = self.query_state
+        like, last_key, table = self.like_filter, self.last_key, self.table_name
+        columns = self.db.schema.columns(table)
+
+        def fetch(task):
+            stream = lambda: self.db.stream_query(query, params, itersize=STREAM_BATCH_SIZE, task=task)
+            if not self.db.replica:
+                return stream()
+            local = None if search_text or like or sort_col != self.pk_col else \
+                lambda rows: select_rows(rows, columns, self.columns, order == "DESC", last_key and last_key[1], PAGE_SIZE)
+            return self.db.replica.read(table, query, params, stream, local, task)
+        return fetch
+
+    def on_page_loaded(self, _):
+        self.loading = False
+        self.page_task = None
+        self.hide_busy()
+        self.has_more = self.page_rows == PAGE_SIZE
+        self.update_status()
+        self.load_rest_if_small()
+
+    def on_page_failed(self, error):
+        self.loading = False
+        self.page_task = None
+        self.has_more = False
+        self.hide_busy()
+        self.status_var.set("Ошибка загрузки данных.")
+
+    def cancel_loading(self):
+        was_loading = self.loading
+        for task in (self.page_task, self.estimate_task):
+            if task:
+                task.cancel()
+        self.page_task = None
+        self.estimate_task = None
+        self.loading = False
+        self.hide_busy()
+        if was_loading:
+            self.has_more = False
+            self.update_status()
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        sort_index = self.columns.index(self.query_state[0])
+        for row in rows:
+            iid = str(row[0])
+            if self.tree.exists(iid):
+                continue
+            values, tags = self.decorate_row(iid, row)
+            self.tree.insert('', 'end', iid=iid, values=self.format_row(values), tags=tags)
+            self.model.append(iid, row)
+        self.fetched_count += len(rows)
+        self.page_rows += len(rows)
+        last_row = rows[-1]
+        self.last_key = (last_row[sort_index], last_row[0])
+        self.refresh_local_view()
+        self.update_status()
+
+    def load_rest_if_small(self):
+        if (self.has_more and not self.loading and self.row_estimate is not None
+                and self.row_estimate <= LOCAL_ROW_LIMIT and len(self.model) < LOCAL_ROW_LIMIT):
+            self.after_idle(self.load_next_page)
+
+    def can_sort_locally(self):
+        if not self.query_state or self.has_more or self.loading or len(self.model) > LOCAL_ROW_LIMIT:
+            return False
+        conditions, params = self.build_filter()
+        return (conditions, params, self.get_ranked_search_text()) == tuple(self.query_state[2:])
+
+    def apply_sort(self):
+        if not self.can_sort_locally():
+            self.load_data()
+            return
+        sort_col, order = self.get_sort_column(), self.get_sort_order()
+        self.local_sort = (sort_col, order == "DESC")
+        self.query_state = (sort_col, order, *self.query_state[2:])
+        self.update_headings()
+        self.apply_local_view()
+
+    def on_heading_click(self, col):
+        if self.get_sort_column() == col:
+            self.sort_order_var.set("ASC" if self.get_sort_order() == "DESC" else "DESC")
+        else:
+            self.sort_col_var.set(col)
+            self.sort_order_var.set("ASC")
+        self.apply_sort()
+
+    def update_headings(self):
+        sort_col, order = self.query_state[:2]
+        for col in self.columns:
+            mark = (" ▼" if order == "DESC" else " ▲") if col == sort_col else ""
+            self.tree.heading(col, text=col.replace('_', ' ').title() + mark)
+
+    def refresh_local_view(self):
+        if self.local_sort or self.hidden or self.quick_filter_entry.get():
+            self.apply_local_view()
+
+    def apply_local_view(self):
+        positions = self.model.order(*self.local_sort) if self.local_sort else range(len(self.model))
+        text = self.quick_filter_entry.get().strip()
+        if text:
+            positions = self.model.matching(positions, text)
+        visible = [self.model.ids[i] for i in positions]
+        pending = [iid for iid in self.changes.inserts if self.tree.exists(iid)]
+        for index, iid in enumerate(pending + visible):
+            self.tree.move(iid, '', index)
+        shown = set(visible)
+        self.hidden = [iid for iid in self.model.ids if iid not in shown]
+        if self.hidden:
+            self.tree.detach(*self.hidden)
+        self.update_status()
+
+    def update_status(self):
+        loaded_count = len(self.model)
+        text = f"Загружено записей: {loaded_count}"
+        if self.row_estimate is not None:
+            text += f" из ~{max(self.row_estimate, loaded_count)}"
+        if self.hidden:
+            text += f", показано: {len(self.model) - len(self.hidden)}"
+        if self.local_sort:
+            text += ", сортировка на клиенте"
+        elif self.query_state and self.query_state[4]:
+            text += ", по релевантности"
+        if self.loading:
+            text += " (загрузка...)"
+        self.status_var.set(text)
+
+    def on_tree_scroll(self, first, last):
+        self.vsb.set(first, last)
+        if self.has_more and not self.loading and not self.page_pending and float(last) >= 0.95:
+            self.page_pending = True
+            self.after_idle(self.load_next_page)
+
+    def on_close(self):
+        if self.changes and not messagebox.askyesno("Несохраненные изменения",
+                                                    f"Изменений не применено: {len(self.changes)}. Закрыть без сохранения?", parent=self):
+            return
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.db.listener.unsubscribe(self.change_token)
+        self.cancel_loading()
+        self.destroy()
+
+    def on_remote_change(self, table, ids):
+        if ids is None:
+            if not self.saving:
+                self.load_data()
+            return
+        sort_col, order, conditions, params, search_text = self.query_state
+        pk_type = self.db.schema.table(self.table_name).data_type(self.pk_col)
+        query = sql.SQL("SELECT {} FROM {} WHERE {} = ANY(%s::{}[])").format(
+            sql.SQL(', ').join(sql.Identifier(c) for c in self.columns), sql.Identifier(self.table_name),
+            sql.Identifier(self.pk_col), sql.SQL(pk_type))
+        if conditions and not search_text:
+            query += sql.SQL(" AND ") + sql.SQL(" AND ").join(conditions)
+        query_params = (list(ids), *params) if not search_text else (list(ids),)
+        self.runner.submit(lambda task: self.db.execute_query(query, query_params, fetch="all", task=task, prepared=True),
+                           lambda rows: self.patch_rows(ids, rows, append=not self.has_more and not search_text))
+
+    def patch_rows(self, ids, rows, append):
+        if rows is None:
+            return
+        found = {str(row[0]): row for row in rows}
+        for iid in ids:
+            if iid in found:
+                values, tags = self.decorate_row(iid, found[iid])
+                if self.tree.exists(iid):
+                    self.tree.item(iid, values=self.format_row(values), tags=tags)
+                    self.model.update(iid, found[iid])
+                elif append and not self.loading:
+                    self.tree.insert('', 'end', iid=iid, values=self.format_row(values), tags=tags)
+                    self.model.append(iid, found[iid])
+            elif self.tree.exists(iid) and iid not in self.changes.inserts:
+                self.tree.delete(iid)
+                self.model.remove(iid)
+        self.refresh_local_view()
+
+    def get_editable_columns(self):
+        generated = GENERATED_COLUMNS.get(self.table_name, [])
+        return [col for col in self.columns[1:] if col not in generated]
+
+    def format_row(self, row):
+        return [str(v) if v is not None else "" for v in row]
+
+    def staged_values(self, values, data):
+        return [data[col] if col in data else value for col, value in zip(self.columns, values)]
+
+    def update_change_buttons(self):
+        state = 'normal' if self.changes and not self.saving else 'disabled'
+        self.apply_button.config(text=f"Применить ({len(self.changes)})" if self.changes else "Применить", state=state)
+        self.discard_button.config(state=state)
+
+    def on_batch_toggle(self):
+        if self.batch_var.get() or not self.changes:
+            return
+        answer = messagebox.askyesnocancel("Пакетный режим", f"Применить изменения ({len(self.changes)})?", parent=self)
+        if answer is None:
+            self.batch_var.set(True)
+        elif answer:
+            self.apply_changes()
+        else:
+            self.discard_changes()
+
+    def show_pending_inserts(self):
+        for temp_id, data in self.changes.inserts.items():
+            values = self.staged_values([""] * len(self.columns), data)
+            self.tree.insert('', 0, iid=temp_id, values=self.format_row(values), tags=('pending_insert',))
+
+    def decorate_row(self, iid, values):
+        if iid in self.changes.deletes:
+            return values, ('pending_delete',)
+        if iid in self.changes.updates:
+            return self.staged_values(values, self.changes.updates[iid]), ('pending_update',)
+        return values, ()
+
+    def stage_insert(self, data):
+        temp_id = self.changes.add_insert(data)
+        values = self.staged_values([""] * len(self.columns), data)
+        self.tree.insert('', 0, iid=temp_id, values=self.format_row(values), tags=('pending_insert',))
+
+    def stage_update(self, iid, data):
+        values = self.tree.item(iid)['values']
+        self.changes.remember(iid, values)
+        if not self.changes.add_update(iid, data):
+            return
+        tags = ('pending_insert',) if iid in self.changes.inserts else ('pending_update',)
+        self.tree.item(iid, values=self.format_row(self.staged_values(values, data)), tags=tags)
+
+    def stage_delete(self, iid):
+        self.changes.remember(iid, self.tree.item(iid)['values'])
+        pending_insert = iid in self.changes.inserts
+        self.changes.add_delete(iid)
+        if pending_insert:
+            self.tree.delete(iid)
+        else:
+            self.tree.item(iid, tags=('pending_delete',))
+
+    def after_staging(self):
+        if self.batch_var.get():
+            self.update_change_buttons()
+        else:
+            self.apply_changes()
 
     def open_add_dialog(self):
-        columns_for_add = self.columns[1:] 
-        dialog = RecordDialog(self, title=f"Добавить запись в '{self.table_name}'", columns=columns_for_add, db_manager=self.db, foreign_keys=self.foreign_keys)
+        if self.saving:
+            return
+        columns_for_add = self.get_editable_columns()
+        dialog = RecordDialog(self, title=f"Добавить запись в '{self.table_name}'", columns=columns_for_add, db_manager=self.db, foreign_keys=self.foreign_keys, table_schema=self.db.schema.table(self.table_name))
         self.wait_window(dialog)
         if dialog.result:
-            self.add_record(dialog.result)
-
-    def add_record(self, data_dict):
-        cols = list(data_dict.keys())
-        vals = list(data_dict.values())
-        placeholders = ', '.join(['%s'] * len(cols))
-        query = f"INSERT INTO {self.table_name} ({', '.join(cols)}) VALUES ({placeholders})"
-        if self.db.execute_query(query, tuple(vals)):
-            messagebox.showinfo("Успех", "Запись успешно добавлена.")
-            self.load_data()
-        else:
-            messagebox.showerror("Ошибка", "Не удалось добавить запись.")
+            self.stage_insert(dialog.result)
+            self.after_staging()
 
     def open_edit_dialog(self):
-        selected_item = self.tree.selection()
-        if not selected_item:
+        if self.saving:
+            return
+        selected_items = [iid for iid in self.tree.selection() if iid not in self.changes.deletes]
+        if not selected_items:
             messagebox.showwarning("Внимание", "Выберите запись для изменения.")
             return
-        
-        item_values = self.tree.item(selected_item[0])['values']
-        initial_data = {col: val for col, val in zip(self.columns, item_values)}
-        
-        columns_for_edit = self.columns[1:]
-        dialog = RecordDialog(self, title=f"Изменить запись в '{self.table_name}'", columns=columns_for_edit, db_manager=self.db, foreign_keys=self.foreign_keys, initial_data=initial_data)
+
+        columns_for_edit = self.get_editable_columns()
+        if len(selected_items) > 1:
+            dialog = RecordDialog(self, title=f"Изменить записей в '{self.table_name}': {len(selected_items)}", columns=columns_for_edit, db_manager=self.db, foreign_keys=self.foreign_keys, table_schema=self.db.schema.table(self.table_name), bulk=True)
+        else:
+            item_values = self.tree.item(selected_items[0])['values']
+            initial_data = {col: val for col, val in zip(self.columns, item_values)}
+            dialog = RecordDialog(self, title=f"Изменить запись в '{self.table_name}'", columns=columns_for_edit, db_manager=self.db, foreign_keys=self.foreign_keys, initial_data=initial_data, table_schema=self.db.schema.table(self.table_name))
         self.wait_window(dialog)
 
         if dialog.result:
-            self.update_record(dialog.result, initial_data[self.columns[0]])
-
-    def update_record(self, new_data, record_id):
-        pk_col = self.columns[0]
-        set_clauses = [f"{col} = %s" for col in new_data.keys()]
-        values = list(new_data.values())
-        values.append(record_id)
-        
-        query = f"UPDATE {self.table_name} SET {', '.join(set_clauses)} WHERE {pk_col} = %s"
-        if self.db.execute_query(query, tuple(values)):
-            messagebox.showinfo("Успех", "Запись успешно обновлена.")
-            self.load_data()
-        else:
-            messagebox.showerror("Ошибка", "Не удалось обновить запись.")
+            for iid in selected_items:
+                self.stage_update(iid, dialog.result)
+            self.after_staging()
 
     def delete_record(self):
-        selected_item = self.tree.selection()
-        if not selected_item:
+        if self.saving:
+            return
+        selected_items = [iid for iid in self.tree.selection() if iid not in self.changes.deletes]
+        if not selected_items:
             messagebox.showwarning("Внимание", "Выберите запись для удаления.")
             return
-        if not messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить выбранную запись?"):
+        question = "Вы уверены, что хотите удалить выбранную запись?" if len(selected_items) == 1 else \
+            f"Вы уверены, что хотите удалить выбранные записи ({len(selected_items)})?"
+        if not messagebox.askyesno("Подтверждение", question):
             return
-        
-        item_values = self.tree.item(selected_item[0])['values']
-        pk_col = self.columns[0]
-        pk_val = item_values[0]
 
-        query = f"DELETE FROM {self.table_name} WHERE {pk_col} = %s"
-        if self.db.execute_query(query, (pk_val,)):
-            messagebox.showinfo("Успех", "Запись успешно удалена.")
-            self.load_data()
+        for iid in selected_items:
+            self.stage_delete(iid)
+        self.after_staging()
+
+    def apply_changes(self):
+        if not self.changes or self.saving:
+            return
+        changes = self.changes
+        schema = self.db.schema.table(self.table_name)
+        self.saving = True
+        self.update_change_buttons()
+        self.status_var.set("Сохранение изменений...")
+        self.runner.submit(lambda task: apply_change_set(self.db, self.table_name, self.columns, schema, changes, task),
+                           lambda result: self.on_changes_applied(changes, result),
+                           lambda error: self.on_changes_failed(changes, error))
+
+    def on_changes_applied(self, changes, result):
+        for temp_id, row in result.inserted.items():
+            if self.tree.exists(temp_id):
+                index = self.tree.index(temp_id)
+                self.tree.delete(temp_id)
+                if not self.tree.exists(str(row[0])):
+                    self.tree.insert('', index, iid=str(row[0]), values=self.format_row(row))
+                    self.model.append(str(row[0]), row)
+        for iid, row in result.updated.items():
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=self.format_row(row), tags=())
+                self.model.update(iid, row)
+        for iid in result.deleted:
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+            self.model.remove(iid)
+        self.changes = ChangeSet()
+        self.refresh_local_view()
+        self.saving = False
+        self.update_change_buttons()
+        self.update_status()
+        self.status_var.set(self.status_var.get() + f". Сохранено: {result.summary()}")
+
+    def on_changes_failed(self, changes, error):
+        self.saving = False
+        if not self.batch_var.get():
+            self.discard_changes()
+        self.update_change_buttons()
+        self.update_status()
+        messagebox.showerror("Ошибка", f"Не удалось сохранить изменения: {error}", parent=self)
+
+    def discard_changes(self):
+        for temp_id in self.changes.inserts:
+            if self.tree.exists(temp_id):
+                self.tree.delete(temp_id)
+        for iid, values in self.changes.originals.items():
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=values, tags=())
+        self.changes = ChangeSet()
+        self.update_change_buttons()
+
+    def import_csv(self):
+        path = filedialog.askopenfilename(parent=self, title=f"Импорт в '{self.table_name}'",
+                                          filetypes=[("CSV", "*.csv"), ("Все файлы", "*.*")])
+        if not path:
+            return
+
+        def work(task):
+            with open(path, newline='', encoding='utf-8') as f:
+                return bulk_io.import_csv(self.db, self.table_name, f)
+
+        self.status_var.set("Импорт...")
+        self.runner.submit(work, self.on_import_done, self.on_bulk_error)
+
+    def on_import_done(self, result):
+        self.db.lookups.invalidate(self.table_name)
+        message = result.summary()
+        if result.errors:
+            shown = result.errors[:20]
+            message += "\n\n" + "\n".join(f"Строка {line_no}: {error}" for line_no, error in shown)
+            if len(result.errors) > len(shown):
+                message += f"\n... и еще {len(result.errors) - len(shown)}"
+            messagebox.showwarning("Импорт завершен с ошибками", message, parent=self)
         else:
-            messagebox.showerror("Ошибка", "Не удалось удалить запись.")
-    
+            messagebox.showinfo("Импорт завершен", message, parent=self)
+        self.load_data()
+
+    def export_csv(self):
+        path = filedialog.asksaveasfilename(parent=self, title=f"Экспорт '{self.table_name}'", defaultextension=".csv",
+                                            initialfile=f"{self.table_name}.csv", filetypes=[("CSV", "*.csv")])
+        if not path:
+            return
+
+        def work(task):
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                bulk_io.export_csv(self.db, self.table_name, f)
+            return path
+
+        self.status_var.set("Экспорт...")
+        self.runner.submit(work, self.on_export_done, self.on_bulk_error)
+
+    def on_export_done(self, path):
+        self.update_status()
+        messagebox.showinfo("Экспорт завершен", f"Таблица сохранена в файл {path}", parent=self)
+
+    def on_bulk_error(self, error):
+        self.update_status()
+        messagebox.showerror("Ошибка", str(error), parent=self)
+
     def reset_filters(self):
         self.search_entry.delete(0, tk.END)
-        default_search_col = self.columns[1] if len(self.columns) > 1 else self.columns[0]
-        self.search_col_var.set(default_search_col)
+        self.quick_filter_entry.delete(0, tk.END)
+        self.search_col_var.set(self.default_search_column())
         self.sort_col_var.set(self.columns[0])
         self.sort_order_var.set("ASC")
         self.load_data()
\ No newline at end of file
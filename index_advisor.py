@@ -0,0 +1,111 @@
+import argparse
+import sys
+from datetime import date, timedelta
+
+from bulk_io import MANAGED_TABLES
+from catalogue_search import SEARCH_TABLES, build_search_query
+from report_engine import (build_overdue_books_query, build_reader_overdue_query, POPULAR_AUTHORS_QUERY,
+                           build_library_activity_query)
+from gui_table_view import PAGE_SIZE, build_like_condition, build_page_query
+from lookup_cache import build_lookup_query
+
+LARGE_TABLE_ROWS = 10000
+
+
+def gui_queries(db, term):
+    queries = []
+    for table in MANAGED_TABLES:
+        columns = db.get_column_names(table)
+        if not columns:
+            continue
+        pk = columns[0]
+        search_col = columns[1] if len(columns) > 1 else pk
+        queries.append((f"{table}: первая страница", *build_page_query(table, pk, pk, "ASC", [], [])))
+        queries.append((f"{table}: поиск по {search_col}",
+                        *build_page_query(table, pk, pk, "ASC", [build_like_condition(search_col)], [f"%{term}%"])))
+
+    for table in MANAGED_TABLES:
+        for col, (ref_table, ref_pk, display_col) in db.schema.foreign_keys(table).items():
+            queries.append((f"{table}.{col}: список {ref_table}", *build_lookup_query(ref_table, ref_pk, display_col)))
+            queries.append((f"{table}.{col}: поиск в {ref_table}", *build_lookup_query(ref_table, ref_pk, display_col, term)))
+
+    for table in SEARCH_TABLES:
+        columns = db.schema.columns(table)
+        queries.append((f"{table}: поиск по релевантности", *build_search_query(table, columns, term, PAGE_SIZE)))
+
+    for sort_by in ("Дням просрочки", "ФИО читателя"):
+        queries.append((f"Отчет: Книги-должники ({sort_by})",
+                        *build_overdue_books_query({'reader_name': term, 'sort_by': sort_by})))
+    queries.append(("Отчет: Популярные авторы", POPULAR_AUTHORS_QUERY, (date.today() - timedelta(days=365), date.today())))
+    queries.append(("Отчет: Читатели-должники", build_reader_overdue_query({'sort_by': "Книгам в просрочке"}), None))
+    queries.append(("Отчет: Активность библиотек", build_library_activity_query({'sort_by': "Книг на руках"}), None))
+    return queries
+
+
+def explain(db, query, params):
+    with db.connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                text = query if isinstance(query, str) else query.as_string(conn)
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + text, params)
+                return cursor.fetchone()[0][0]
+        finally:
+            conn.rollback()
+
+
+def find_seq_scans(node):
+    if node['Node Type'] == 'Seq Scan':
+        yield node['Relation Name']
+    for child in node.get('Plans', []):
+        yield from find_seq_scans(child)
+
+
+def load_table_sizes(db):
+    rows = db.execute_query("""
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_class c
+        WHERE c.relkind IN ('r', 'p') AND c.relnamespace = current_schema()::regnamespace
+    """, fetch="all")
+    return dict(rows or [])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN (ANALYZE, BUFFERS) для запросов приложения и поиск последовательных сканирований.")
+    parser.add_argument("--term", default="ов", help="строка для запросов поиска")
+    parser.add_argument("--min-rows", type=int, default=LARGE_TABLE_ROWS,
+                        help="сообщать о Seq Scan только по таблицам не меньше этого размера")
+    args = parser.parse_args(argv)
+
+    from db_manager import DatabaseManager
+    db = DatabaseManager()
+    if not db.is_connected():
+        return 2
+    db.schema.load()
+
+    problems = 0
+    try:
+        sizes = load_table_sizes(db)
+        for label, query, params in gui_queries(db, args.term):
+            try:
+                plan = explain(db, query, params)
+            except Exception as e:
+                print(f"[ОШИБКА] {label}: {e}")
+                problems += 1
+                continue
+            top = plan['Plan']
+            print(f"{label}: {plan['Execution Time']:.1f} мс, "
+                  f"буферы: hit={top.get('Shared Hit Blocks', 0)} read={top.get('Shared Read Blocks', 0)}")
+            for relation in sorted(set(find_seq_scans(top))):
+                rows = sizes.get(relation, 0)
+                if rows >= args.min_rows:
+                    print(f"    Seq Scan по {relation} (~{rows} строк)")
+                    problems += 1
+    finally:
+        db.close()
+
+    print(f"Найдено проблем: {problems}")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+
+from psycopg2 import sql
+
+
+LOOKUP_LIMIT = 50
+MAX_CACHED_SEARCHES = 200
+MAX_CACHED_LABELS = 5000
+
+
+def format_choice(record_id, name):
+    return f"{name} ({record_id})"
+
+
+def build_lookup_query(table, pk, display_col, text="", limit=LOOKUP_LIMIT):
+    query = sql.SQL("SELECT {}, {} FROM {}").format(sql.Identifier(pk), sql.Identifier(display_col), sql.Identifier(table))
+    params = []
+    if text.strip():
+        query += sql.SQL(" WHERE {} ILIKE %s").format(sql.Identifier(display_col))
+        params.append(f"%{text.strip()}%")
+    query += sql.SQL(" ORDER BY {} LIMIT %s").format(sql.Identifier(display_col))
+    params.append(limit)
+    return query, tuple(params)
+
+
+def build_label_query(table, pk, display_col):
+    return sql.SQL("SELECT {} FROM {} WHERE {} = %s").format(
+        sql.Identifier(display_col), sql.Identifier(table), sql.Identifier(pk))
+
+
+class LookupCache:
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self.lock = threading.Lock()
+        self.labels = OrderedDict()
+        self.searches = OrderedDict()
+
+    def search(self, table, pk, display_col, text="", limit=LOOKUP_LIMIT, task=None):
+        key = (table, pk, display_col)
+        search_key = (key, text.strip().lower(), limit)
+        with self.lock:
+            if search_key in self.searches:
+                self.searches.move_to_end(search_key)
+                return self.searches[search_key]
+
+        query, params = build_lookup_query(table, pk, display_col, text, limit)
+        rows = self.fetch(table, query, params, task, None)
+        if rows is None:
+            return None
+
+        with self.lock:
+            for record_id, name in rows:
+                self.remember_label(key + (record_id,), name)
+            self.searches[search_key] = rows
+            while len(self.searches) > MAX_CACHED_SEARCHES:
+                self.searches.popitem(last=False)
+        return rows
+
+    def remember_label(self, key, name):
+        self.labels[key] = name
+        self.labels.move_to_end(key)
+        while len(self.labels) > MAX_CACHED_LABELS:
+            self.labels.popitem(last=False)
+
+    def cached_label(self, table, pk, display_col, record_id):
+        key = (table, pk, display_col, record_id)
+        with self.lock:
+            if key in self.labels:
+                self.labels.move_to_end(key)
+            return self.labels.get(key)
+
+    def get_label(self, table, pk, display_col, record_id, task=None):
+        name = self.cached_label(table, pk, display_col, record_id)
+        if name is not None:
+            return name
+
+        columns = self.db.schema.columns(table)
+        rows = self.fetch(table, build_label_query(table, pk, display_col), (record_id,), task,
+                          lambda mirror: [(row[columns.index(display_col)],) for row in mirror
+                                          if str(row[columns.index(pk)]) == str(record_id)])
+        if not rows:
+            return None
+        with self.lock:
+            self.remember_label((table, pk, display_col, record_id), rows[0][0])
+        return rows[0][0]
+
+    def fetch(self, table, query, params, task, local):
+        fetch = lambda: [self.db.execute_query(query, params, fetch="all", task=task, prepared=True)]
+        if not self.db.replica:
+            return fetch()[0]
+        batches = list(self.db.replica.read(table, query, params, fetch, local, task))
+        if any(batch is None for batch in batches):
+            return None
+        return [row for batch in batches for row in batch]
+
+    def invalidate(self, table):
+        with self.lock:
+            for key in [k for k in self.labels if k[0] == table]:
+                del self.labels[key]
+            for key in [k for k in self.searches if k[0][0] == table]:
+                del self.searches[key]
\ No newline at end of file
@@ -1,6 +1,11 @@
+import sys
+import time
+
+STARTED_AT = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk
-from tkinter import font 
+from tkinter import font
 
 try:
     from ctypes import windll
@@ -8,17 +13,28 @@ try:
 except ImportError:
     pass
 
-from db_manager import DatabaseManager
-from gui_table_view import TableView
-import gui_reports
+from query_runner import QueryRunner
+
+TABLE_NAMES = ["libraries", "themes", "books", "readers", "subscriptions", "employees"]
+
+
+def open_database():
+    from db_manager import DatabaseManager
+    db_manager = DatabaseManager()
+    if not db_manager.is_connected():
+        return None
+    db_manager.schema.load()
+    return db_manager
+
 
 class App(tk.Tk):
-    def __init__(self, db_manager):
+    def __init__(self, connect=True):
         super().__init__()
-        self.db = db_manager
-        
+        self.db = None
+        self.runner = QueryRunner(self)
+
         self.title("Система управления библиотекой")
-        self.geometry("400x450")
+        self.geometry("400x590")
 
 
         try:
@@ -27,40 +43,95 @@ class App(tk.Tk):
             self.option_add("*Font", default_font)
         except tk.TclError:
             print("Шрифт 'Segoe UI' не найден. Будет использован шрифт по умолчанию.")
-        
+
 
         main_frame = ttk.Frame(self, padding="10")
         main_frame.pack(expand=True, fill=tk.BOTH)
+        self.db_buttons = []
 
         tables_frame = ttk.LabelFrame(main_frame, text="Управление таблицами")
         tables_frame.pack(fill=tk.X, pady=10)
 
-        table_names = ["libraries", "themes", "books", "readers", "subscriptions", "employees"]
-        for name in table_names:
-            ttk.Button(tables_frame, text=name.replace('_', ' ').title(), command=lambda n=name: self.open_table_view(n)).pack(fill=tk.X, padx=5, pady=2)
+        for name in TABLE_NAMES:
+            self.add_button(tables_frame, name.replace('_', ' ').title(), lambda n=name: self.open_table_view(n))
 
         reports_frame = ttk.LabelFrame(main_frame, text="Отчеты")
         reports_frame.pack(fill=tk.X, pady=10)
 
-        ttk.Button(reports_frame, text="Отчет: Книги-должники", command=lambda: gui_reports.show_overdue_books_report(self, self.db)).pack(fill=tk.X, padx=5, pady=2)
-        ttk.Button(reports_frame, text="Отчет: Популярные авторы", command=lambda: gui_reports.show_popular_authors_report(self, self.db)).pack(fill=tk.X, padx=5, pady=2)
-        ttk.Button(reports_frame, text="Отчет: Активность библиотек", command=lambda: gui_reports.show_library_activity_report(self, self.db)).pack(fill=tk.X, padx=5, pady=2)
+        self.add_button(reports_frame, "Отчет: Книги-должники", lambda: self.open_report('show_overdue_books_report'))
+        self.add_button(reports_frame, "Отчет: Читатели-должники", lambda: self.open_report('show_reader_overdue_report'))
+        self.add_button(reports_frame, "Отчет: Популярные авторы", lambda: self.open_report('show_popular_authors_report'))
+        self.add_button(reports_frame, "Отчет: Активность библиотек", lambda: self.open_report('show_library_activity_report'))
+
+        service_frame = ttk.LabelFrame(main_frame, text="Сервис")
+        service_frame.pack(fill=tk.X, pady=10)
+
+        self.add_button(service_frame, "Диагностика запросов", self.open_diagnostics)
+
+        status_frame = ttk.Frame(self, padding=(10, 0, 10, 5))
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_var = tk.StringVar()
+        self.status_label = ttk.Label(status_frame, textvariable=self.status_var, anchor='w')
+        self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.retry_button = ttk.Button(status_frame, text="Повторить", command=self.connect)
 
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        if connect:
+            self.connect()
+
+    def add_button(self, parent, text, command):
+        button = ttk.Button(parent, text=text, command=command, state='disabled')
+        button.pack(fill=tk.X, padx=5, pady=2)
+        self.db_buttons.append(button)
+
+    def set_status(self, text, color):
+        self.status_var.set(text)
+        self.status_label.config(foreground=color)
+
+    def connect(self):
+        self.retry_button.pack_forget()
+        self.set_status("Подключение к базе данных...", 'gray')
+        self.runner.submit(lambda task: open_database(), self.on_connected, self.on_connect_failed)
+
+    def on_connected(self, db_manager):
+        if db_manager is None:
+            self.on_connect_failed(None)
+            return
+        self.db = db_manager
+        params = db_manager.params
+        self.set_status(f"Подключено: {params.get('host')}:{params.get('port')}/{params.get('database')}", 'dark green')
+        for button in self.db_buttons:
+            button.config(state='normal')
+        self.db.listener.start(self)
+
+    def on_connect_failed(self, error):
+        self.set_status("Нет соединения с базой данных", 'red')
+        self.retry_button.pack(side=tk.RIGHT)
 
     def open_table_view(self, table_name):
+        from gui_table_view import TableView
         TableView(self, table_name, self.db)
 
+    def open_report(self, name):
+        import gui_reports
+        getattr(gui_reports, name)(self, self.db)
+
+    def open_diagnostics(self):
+        from gui_diagnostics import DiagnosticsWindow
+        DiagnosticsWindow(self, self.db)
+
     def on_closing(self):
-        print("Закрытие соединения с базой данных...")
-        self.db.close()
+        if self.db:
+            print("Закрытие соединения с базой данных...")
+            self.db.close()
         self.destroy()
 
 if __name__ == '__main__':
-    db_manager = DatabaseManager()
-    
-    if db_manager.conn:
-        app = App(db_manager)
-        app.mainloop()
+    measure_startup = '--startup-time' in sys.argv[1:]
+    app = App(connect=not measure_startup)
+    if measure_startup:
+        app.update()
+        print(f"STARTUP_MS={(time.perf_counter() - STARTED_AT) * 1000:.1f}")
+        app.destroy()
     else:
-        print("Не удалось запустить приложение из-за ошибки подключения к БД.")
\ No newline at end of file
+        app.mainloop()
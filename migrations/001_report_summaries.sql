@@ -0,0 +1,176 @@
+-- Сводные таблицы для отчетов "Активность библиотек" и "Популярные авторы".
+-- Поддерживаются триггерами на books и subscriptions, поэтому отчеты
+-- читают готовые агрегаты вместо JOIN/GROUP BY по всем выдачам.
+
+CREATE TABLE IF NOT EXISTS library_stats (
+    library_id INT PRIMARY KEY REFERENCES libraries(library_id) ON DELETE CASCADE,
+    available BIGINT NOT NULL DEFAULT 0,
+    on_loan BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS author_loans_daily (
+    give_date DATE NOT NULL,
+    author VARCHAR(100) NOT NULL,
+    loans BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (give_date, author)
+);
+
+CREATE INDEX IF NOT EXISTS idx_author_loans_daily_updated ON author_loans_daily(updated_at);
+
+
+CREATE OR REPLACE FUNCTION adjust_library_stats(p_library_id INT, p_available BIGINT, p_on_loan BIGINT)
+RETURNS VOID AS $$
+BEGIN
+    IF p_library_id IS NULL OR (p_available = 0 AND p_on_loan = 0) THEN
+        RETURN;
+    END IF;
+    UPDATE library_stats
+    SET available = available + p_available,
+        on_loan = on_loan + p_on_loan,
+        updated_at = now()
+    WHERE library_id = p_library_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION adjust_author_loans(p_author VARCHAR, p_give_date DATE, p_loans BIGINT)
+RETURNS VOID AS $$
+BEGIN
+    IF p_author IS NULL OR p_give_date IS NULL OR p_loans = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO author_loans_daily (give_date, author, loans)
+    VALUES (p_give_date, p_author, p_loans)
+    ON CONFLICT (give_date, author)
+    DO UPDATE SET loans = author_loans_daily.loans + EXCLUDED.loans, updated_at = now();
+    DELETE FROM author_loans_daily WHERE give_date = p_give_date AND author = p_author AND loans <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION library_stats_on_library()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO library_stats (library_id) VALUES (NEW.library_id) ON CONFLICT DO NOTHING;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_library_stats_library ON libraries;
+CREATE TRIGGER trg_library_stats_library
+AFTER INSERT ON libraries
+FOR EACH ROW
+EXECUTE FUNCTION library_stats_on_library();
+
+
+CREATE OR REPLACE FUNCTION report_summaries_on_book()
+RETURNS TRIGGER AS $$
+DECLARE
+    open_loans BIGINT;
+    loan_day RECORD;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0), 0);
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        -- BEFORE DELETE: выдачи еще не удалены каскадом
+        SELECT count(*) INTO open_loans FROM subscriptions WHERE book_id = OLD.book_id AND return_date IS NULL;
+        PERFORM adjust_library_stats(OLD.library_id, -COALESCE(OLD.quantity, 0), -open_loans);
+        FOR loan_day IN SELECT give_date, count(*) AS loans FROM subscriptions WHERE book_id = OLD.book_id GROUP BY give_date LOOP
+            PERFORM adjust_author_loans(OLD.author, loan_day.give_date, -loan_day.loans);
+        END LOOP;
+        RETURN OLD;
+    END IF;
+
+    IF OLD.library_id IS DISTINCT FROM NEW.library_id THEN
+        SELECT count(*) INTO open_loans FROM subscriptions WHERE book_id = NEW.book_id AND return_date IS NULL;
+        PERFORM adjust_library_stats(OLD.library_id, -COALESCE(OLD.quantity, 0), -open_loans);
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0), open_loans);
+    ELSE
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0) - COALESCE(OLD.quantity, 0), 0);
+    END IF;
+
+    IF OLD.author IS DISTINCT FROM NEW.author THEN
+        FOR loan_day IN SELECT give_date, count(*) AS loans FROM subscriptions WHERE book_id = NEW.book_id GROUP BY give_date LOOP
+            PERFORM adjust_author_loans(OLD.author, loan_day.give_date, -loan_day.loans);
+            PERFORM adjust_author_loans(NEW.author, loan_day.give_date, loan_day.loans);
+        END LOOP;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_report_summaries_book ON books;
+CREATE TRIGGER trg_report_summaries_book
+AFTER INSERT OR UPDATE OF library_id, author, quantity ON books
+FOR EACH ROW
+EXECUTE FUNCTION report_summaries_on_book();
+
+DROP TRIGGER IF EXISTS trg_report_summaries_book_delete ON books;
+CREATE TRIGGER trg_report_summaries_book_delete
+BEFORE DELETE ON books
+FOR EACH ROW
+EXECUTE FUNCTION report_summaries_on_book();
+
+
+CREATE OR REPLACE FUNCTION report_summaries_on_subscription()
+RETURNS TRIGGER AS $$
+DECLARE
+    old_book RECORD;
+    new_book RECORD;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT library_id, author INTO old_book FROM books WHERE book_id = OLD.book_id;
+        -- книга уже удалена: сводки поправил триггер на books
+        IF FOUND THEN
+            PERFORM adjust_library_stats(old_book.library_id, 0, CASE WHEN OLD.return_date IS NULL THEN -1 ELSE 0 END);
+            PERFORM adjust_author_loans(old_book.author, OLD.give_date, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT library_id, author INTO new_book FROM books WHERE book_id = NEW.book_id;
+        IF FOUND THEN
+            PERFORM adjust_library_stats(new_book.library_id, 0, CASE WHEN NEW.return_date IS NULL THEN 1 ELSE 0 END);
+            PERFORM adjust_author_loans(new_book.author, NEW.give_date, 1);
+        END IF;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_report_summaries_subscription ON subscriptions;
+CREATE TRIGGER trg_report_summaries_subscription
+AFTER INSERT OR DELETE OR UPDATE OF book_id, give_date, return_date ON subscriptions
+FOR EACH ROW
+EXECUTE FUNCTION report_summaries_on_subscription();
+
+
+-- Полный пересчет сводок (первичное заполнение и исправление расхождений)
+CREATE OR REPLACE FUNCTION refresh_report_summaries()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE books, subscriptions IN SHARE MODE;
+
+    DELETE FROM library_stats;
+    INSERT INTO library_stats (library_id, available, on_loan)
+    SELECT l.library_id,
+           COALESCE((SELECT SUM(b.quantity) FROM books b WHERE b.library_id = l.library_id), 0),
+           (SELECT count(*) FROM subscriptions s JOIN books b ON b.book_id = s.book_id
+            WHERE b.library_id = l.library_id AND s.return_date IS NULL)
+    FROM libraries l;
+
+    DELETE FROM author_loans_daily;
+    INSERT INTO author_loans_daily (give_date, author, loans)
+    SELECT s.give_date, b.author, count(*)
+    FROM subscriptions s JOIN books b ON b.book_id = s.book_id
+    WHERE s.give_date IS NOT NULL
+    GROUP BY s.give_date, b.author;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_report_summaries();
@@ -0,0 +1,160 @@
+-- Учет экземпляров: books.quantity — экземпляры в наличии, books.on_loan — на руках.
+-- Триггер trg_book_issue теперь обрабатывает выдачу, возврат, удаление выдачи
+-- и смену книги в выдаче, а сводка library_stats строится по этим счетчикам.
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS on_loan INT NOT NULL DEFAULT 0 CHECK (on_loan >= 0);
+
+UPDATE books b
+SET on_loan = open_loans.cnt
+FROM (SELECT book_id, count(*) AS cnt FROM subscriptions WHERE return_date IS NULL GROUP BY book_id) open_loans
+WHERE b.book_id = open_loans.book_id AND b.on_loan <> open_loans.cnt;
+
+-- Старый триггер уменьшал quantity при каждой выдаче и никогда не возвращал экземпляр.
+-- Если все выдачи в базе создавались через него, остатки можно исправить так:
+-- UPDATE books b SET quantity = quantity + r.cnt
+-- FROM (SELECT book_id, count(*) AS cnt FROM subscriptions WHERE return_date IS NOT NULL GROUP BY book_id) r
+-- WHERE b.book_id = r.book_id;
+
+
+CREATE OR REPLACE FUNCTION adjust_book_inventory(p_book_id INT, p_delta INT)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE books
+    SET quantity = quantity - p_delta,
+        on_loan = on_loan + p_delta
+    WHERE book_id = p_book_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_book_inventory()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.return_date IS NULL THEN
+        IF TG_OP = 'DELETE' OR NEW.return_date IS NOT NULL OR NEW.book_id IS DISTINCT FROM OLD.book_id THEN
+            PERFORM adjust_book_inventory(OLD.book_id, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.return_date IS NULL THEN
+        IF TG_OP = 'INSERT' OR OLD.return_date IS NOT NULL OR NEW.book_id IS DISTINCT FROM OLD.book_id THEN
+            PERFORM adjust_book_inventory(NEW.book_id, 1);
+        END IF;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_book_issue ON subscriptions;
+CREATE TRIGGER trg_book_issue
+AFTER INSERT OR DELETE OR UPDATE OF book_id, return_date ON subscriptions
+FOR EACH ROW
+EXECUTE FUNCTION update_book_inventory();
+
+DROP FUNCTION IF EXISTS decrease_book_quantity();
+
+
+CREATE OR REPLACE VIEW v_book_availability AS
+SELECT book_id, library_id, title, author,
+       quantity AS available,
+       on_loan,
+       quantity + on_loan AS total
+FROM books;
+
+
+-- library_stats теперь следует только за счетчиками books
+CREATE OR REPLACE FUNCTION report_summaries_on_book()
+RETURNS TRIGGER AS $$
+DECLARE
+    loan_day RECORD;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0), NEW.on_loan);
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        PERFORM adjust_library_stats(OLD.library_id, -COALESCE(OLD.quantity, 0), -OLD.on_loan);
+        FOR loan_day IN SELECT give_date, count(*) AS loans FROM subscriptions WHERE book_id = OLD.book_id GROUP BY give_date LOOP
+            PERFORM adjust_author_loans(OLD.author, loan_day.give_date, -loan_day.loans);
+        END LOOP;
+        RETURN OLD;
+    END IF;
+
+    IF OLD.library_id IS DISTINCT FROM NEW.library_id THEN
+        PERFORM adjust_library_stats(OLD.library_id, -COALESCE(OLD.quantity, 0), -OLD.on_loan);
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0), NEW.on_loan);
+    ELSE
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0) - COALESCE(OLD.quantity, 0), NEW.on_loan - OLD.on_loan);
+    END IF;
+
+    IF OLD.author IS DISTINCT FROM NEW.author THEN
+        FOR loan_day IN SELECT give_date, count(*) AS loans FROM subscriptions WHERE book_id = NEW.book_id GROUP BY give_date LOOP
+            PERFORM adjust_author_loans(OLD.author, loan_day.give_date, -loan_day.loans);
+            PERFORM adjust_author_loans(NEW.author, loan_day.give_date, loan_day.loans);
+        END LOOP;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_report_summaries_book ON books;
+CREATE TRIGGER trg_report_summaries_book
+AFTER INSERT OR UPDATE OF library_id, author, quantity, on_loan ON books
+FOR EACH ROW
+EXECUTE FUNCTION report_summaries_on_book();
+
+CREATE OR REPLACE FUNCTION report_summaries_on_subscription()
+RETURNS TRIGGER AS $$
+DECLARE
+    book_author VARCHAR;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT author INTO book_author FROM books WHERE book_id = OLD.book_id;
+        IF FOUND THEN
+            PERFORM adjust_author_loans(book_author, OLD.give_date, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT author INTO book_author FROM books WHERE book_id = NEW.book_id;
+        IF FOUND THEN
+            PERFORM adjust_author_loans(book_author, NEW.give_date, 1);
+        END IF;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_report_summaries_subscription ON subscriptions;
+CREATE TRIGGER trg_report_summaries_subscription
+AFTER INSERT OR DELETE OR UPDATE OF book_id, give_date ON subscriptions
+FOR EACH ROW
+EXECUTE FUNCTION report_summaries_on_subscription();
+
+CREATE OR REPLACE FUNCTION refresh_report_summaries()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE books, subscriptions IN SHARE MODE;
+
+    DELETE FROM library_stats;
+    INSERT INTO library_stats (library_id, available, on_loan)
+    SELECT l.library_id, COALESCE(SUM(b.quantity), 0), COALESCE(SUM(b.on_loan), 0)
+    FROM libraries l
+    LEFT JOIN books b ON b.library_id = l.library_id
+    GROUP BY l.library_id;
+
+    DELETE FROM author_loans_daily;
+    INSERT INTO author_loans_daily (give_date, author, loans)
+    SELECT s.give_date, b.author, count(*)
+    FROM subscriptions s JOIN books b ON b.book_id = s.book_id
+    WHERE s.give_date IS NOT NULL
+    GROUP BY s.give_date, b.author;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_report_summaries();
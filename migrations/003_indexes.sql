@@ -0,0 +1,30 @@
+-- Индексы под реальные запросы приложения:
+-- внешние ключи (JOIN в отчетах, каскадные удаления, триггеры учета),
+-- триграммы для поиска "col::text ILIKE '%x%'" в TableView и отчете о должниках,
+-- частичный индекс открытых выдач.
+-- CONCURRENTLY не блокирует запись, поэтому файл нельзя выполнять внутри транзакции.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_library_id ON books(library_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_theme_id ON books(theme_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_subscriptions_book_id ON subscriptions(book_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_subscriptions_reader_id ON subscriptions(reader_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_employees_library_id ON employees(library_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_subscriptions_open ON subscriptions(give_date)
+    WHERE return_date IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_libraries_name_trgm ON libraries USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_title_trgm ON books USING gin (title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_author_trgm ON books USING gin (author gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_publisher_trgm ON books USING gin (publisher gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_full_name_trgm ON readers USING gin (full_name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_address_trgm ON readers USING gin (address gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_employees_full_name_trgm ON employees USING gin (full_name gin_trgm_ops);
+
+ANALYZE libraries;
+ANALYZE books;
+ANALYZE readers;
+ANALYZE subscriptions;
+ANALYZE employees;
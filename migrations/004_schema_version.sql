@@ -0,0 +1,47 @@
+-- Номер версии схемы для кэша метаданных приложения (schema_cache.py).
+-- Событийные триггеры увеличивают его при любом DDL вне временных схем.
+-- Создание событийных триггеров требует прав суперпользователя; без них
+-- приложение просто перечитывает метаданные при каждом запуске.
+-- Функции триггеров выполняются с правами владельца и фиксированным
+-- search_path, чтобы DDL любого пользователя мог обновить версию и не мог
+-- подменить schema_version своей таблицей.
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    version BIGINT NOT NULL DEFAULT 1,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO schema_version (singleton) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_schema_version_on_ddl()
+RETURNS event_trigger AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_event_trigger_ddl_commands()
+               WHERE schema_name IS NULL OR schema_name NOT LIKE 'pg_temp%') THEN
+        UPDATE schema_version SET version = version + 1, changed_at = now();
+    END IF;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = pg_catalog, public, pg_temp;
+
+CREATE OR REPLACE FUNCTION bump_schema_version_on_drop()
+RETURNS event_trigger AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_event_trigger_dropped_objects()
+               WHERE NOT is_temporary) THEN
+        UPDATE schema_version SET version = version + 1, changed_at = now();
+    END IF;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = pg_catalog, public, pg_temp;
+
+DROP EVENT TRIGGER IF EXISTS trg_schema_version_ddl;
+CREATE EVENT TRIGGER trg_schema_version_ddl ON ddl_command_end
+EXECUTE FUNCTION bump_schema_version_on_ddl();
+
+DROP EVENT TRIGGER IF EXISTS trg_schema_version_drop;
+CREATE EVENT TRIGGER trg_schema_version_drop ON sql_drop
+EXECUTE FUNCTION bump_schema_version_on_drop();
@@ -0,0 +1,65 @@
+-- Полнотекстовый поиск по каталогу книг и читателей.
+-- Столбцы search_vector заполняются триггерами; опечатки в фамилиях
+-- ловит поиск по триграммам (индексы из 003_indexes.sql).
+-- Индексы создаются CONCURRENTLY, поэтому файл нельзя выполнять внутри транзакции.
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+ALTER TABLE readers ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+CREATE OR REPLACE FUNCTION book_search_document(p_title TEXT, p_author TEXT, p_publisher TEXT)
+RETURNS TSVECTOR AS $$
+    SELECT setweight(to_tsvector('russian', coalesce(p_title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(p_author, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(p_publisher, '')), 'C')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION reader_search_document(p_full_name TEXT, p_address TEXT)
+RETURNS TSVECTOR AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(p_full_name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(p_address, '')), 'C')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION update_book_search_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := book_search_document(NEW.title, NEW.author, NEW.publisher);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_reader_search_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := reader_search_document(NEW.full_name, NEW.address);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_books_search_vector ON books;
+CREATE TRIGGER trg_books_search_vector
+BEFORE INSERT OR UPDATE OF title, author, publisher ON books
+FOR EACH ROW EXECUTE FUNCTION update_book_search_vector();
+
+DROP TRIGGER IF EXISTS trg_readers_search_vector ON readers;
+CREATE TRIGGER trg_readers_search_vector
+BEFORE INSERT OR UPDATE OF full_name, address ON readers
+FOR EACH ROW EXECUTE FUNCTION update_reader_search_vector();
+
+-- Пересчет после загрузки с отключенными триггерами (COPY в bench_datagen.py).
+CREATE OR REPLACE FUNCTION refresh_search_vectors()
+RETURNS VOID AS $$
+BEGIN
+    UPDATE books SET search_vector = book_search_document(title, author, publisher)
+    WHERE search_vector IS DISTINCT FROM book_search_document(title, author, publisher);
+    UPDATE readers SET search_vector = reader_search_document(full_name, address)
+    WHERE search_vector IS DISTINCT FROM reader_search_document(full_name, address);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_search_vectors();
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_search_vector ON books USING gin (search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_search_vector ON readers USING gin (search_vector);
+
+ANALYZE books;
+ANALYZE readers;
@@ -0,0 +1,64 @@
+-- Уведомления об изменениях для открытых окон приложения (change_listener.py).
+-- Триггеры уровня оператора отправляют в канал library_changes одно сообщение
+-- на оператор: {"table": ..., "op": ..., "ids": [...]}. Если строк больше
+-- notify_max_ids(), ids = null и окна перечитывают таблицу целиком.
+
+CREATE OR REPLACE FUNCTION notify_max_ids()
+RETURNS INT AS $$ SELECT 500 $$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION notify_table_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    pk TEXT := TG_ARGV[0];
+    changed BIGINT := 0;
+    ids JSONB;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format('SELECT count(*), jsonb_agg(%I) FROM new_rows', pk) INTO changed, ids;
+    ELSIF TG_OP = 'UPDATE' THEN
+        EXECUTE format('SELECT count(*), jsonb_agg(id) FROM (SELECT %I AS id FROM new_rows UNION SELECT %I FROM old_rows) s',
+                       pk, pk) INTO changed, ids;
+    ELSIF TG_OP = 'DELETE' THEN
+        EXECUTE format('SELECT count(*), jsonb_agg(%I) FROM old_rows', pk) INTO changed, ids;
+    ELSE
+        changed := NULL;
+    END IF;
+
+    IF changed = 0 THEN
+        RETURN NULL;
+    END IF;
+    IF changed IS NULL OR changed > notify_max_ids() THEN
+        ids := NULL;
+    END IF;
+    PERFORM pg_notify('library_changes', json_build_object(
+        'table', TG_TABLE_NAME, 'op', lower(TG_OP), 'ids', ids)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t RECORD;
+BEGIN
+    FOR t IN SELECT * FROM (VALUES ('libraries', 'library_id'), ('themes', 'theme_id'), ('books', 'book_id'),
+                                   ('readers', 'reader_id'), ('subscriptions', 'sub_id'),
+                                   ('employees', 'employee_id')) v(tbl, pk) LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_notify_' || t.tbl || '_insert', t.tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change(%L)',
+                       'trg_notify_' || t.tbl || '_insert', t.tbl, t.pk);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_notify_' || t.tbl || '_update', t.tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change(%L)',
+                       'trg_notify_' || t.tbl || '_update', t.tbl, t.pk);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_notify_' || t.tbl || '_delete', t.tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change(%L)',
+                       'trg_notify_' || t.tbl || '_delete', t.tbl, t.pk);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_notify_' || t.tbl || '_truncate', t.tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change(%L)',
+                       'trg_notify_' || t.tbl || '_truncate', t.tbl, t.pk);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,272 @@
+-- Секционирование subscriptions по годам give_date и архив давно возвращенных выдач.
+-- Запросы с условием на give_date читают только нужные секции; строки вне
+-- созданных секций попадают в subscriptions_default.
+-- Первичный ключ секционированной таблицы обязан включать give_date, поэтому
+-- ключ становится (sub_id, give_date), а пустые даты выдачи заполняются
+-- датой возврата или текущей датой.
+-- При переносе строк между секциями и в архив триггеры учета пропускают
+-- работу, если в транзакции установлено library.moving_loans = on: выдачи
+-- не появляются и не исчезают, а только меняют место хранения.
+
+DO $$
+DECLARE
+    first_year INT;
+    y INT;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'subscriptions'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE subscriptions RENAME TO subscriptions_old;
+    ALTER TABLE subscriptions_old RENAME CONSTRAINT subscriptions_pkey TO subscriptions_old_pkey;
+
+    CREATE TABLE subscriptions (
+        sub_id INT NOT NULL DEFAULT nextval('subscriptions_sub_id_seq'),
+        book_id INT NOT NULL REFERENCES books(book_id) ON DELETE CASCADE,
+        reader_id INT NOT NULL REFERENCES readers(reader_id) ON DELETE CASCADE,
+        give_date DATE NOT NULL DEFAULT CURRENT_DATE,
+        return_date DATE,
+        prepayment NUMERIC(10,2) DEFAULT 0 CHECK (prepayment >= 0),
+        PRIMARY KEY (sub_id, give_date)
+    ) PARTITION BY RANGE (give_date);
+
+    ALTER SEQUENCE subscriptions_sub_id_seq OWNED BY subscriptions.sub_id;
+
+    SELECT LEAST(EXTRACT(YEAR FROM min(give_date))::INT, EXTRACT(YEAR FROM CURRENT_DATE)::INT - 5)
+    INTO first_year FROM subscriptions_old;
+    first_year := COALESCE(first_year, EXTRACT(YEAR FROM CURRENT_DATE)::INT - 5);
+    FOR y IN first_year .. EXTRACT(YEAR FROM CURRENT_DATE)::INT + 1 LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF subscriptions FOR VALUES FROM (%L) TO (%L)',
+                       'subscriptions_y' || y, make_date(y, 1, 1), make_date(y + 1, 1, 1));
+    END LOOP;
+    CREATE TABLE subscriptions_default PARTITION OF subscriptions DEFAULT;
+
+    INSERT INTO subscriptions (sub_id, book_id, reader_id, give_date, return_date, prepayment)
+    SELECT sub_id, book_id, reader_id, COALESCE(give_date, return_date, CURRENT_DATE), return_date, prepayment
+    FROM subscriptions_old;
+
+    DROP TABLE subscriptions_old;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_subscriptions_dates ON subscriptions(give_date, return_date);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_book_id ON subscriptions(book_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_reader_id ON subscriptions(reader_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_open ON subscriptions(give_date) WHERE return_date IS NULL;
+
+
+CREATE TABLE IF NOT EXISTS subscriptions_archive (
+    sub_id INT PRIMARY KEY,
+    book_id INT NOT NULL REFERENCES books(book_id) ON DELETE CASCADE,
+    reader_id INT NOT NULL REFERENCES readers(reader_id) ON DELETE CASCADE,
+    give_date DATE NOT NULL,
+    return_date DATE NOT NULL,
+    prepayment NUMERIC(10,2),
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_subscriptions_archive_book_id ON subscriptions_archive(book_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_archive_reader_id ON subscriptions_archive(reader_id);
+
+
+CREATE OR REPLACE FUNCTION moving_loans()
+RETURNS BOOLEAN AS $$
+    SELECT COALESCE(current_setting('library.moving_loans', true), '') = 'on'
+$$ LANGUAGE sql STABLE;
+
+-- Создает годовые секции до p_until включительно; строки из секции по
+-- умолчанию, попадающие в новую секцию, переносятся в нее.
+CREATE OR REPLACE FUNCTION ensure_subscription_partitions(p_until DATE)
+RETURNS INT AS $$
+DECLARE
+    y INT;
+    part TEXT;
+    created INT := 0;
+BEGIN
+    PERFORM set_config('library.moving_loans', 'on', true);
+    FOR y IN EXTRACT(YEAR FROM CURRENT_DATE)::INT .. EXTRACT(YEAR FROM p_until)::INT LOOP
+        part := 'subscriptions_y' || y;
+        CONTINUE WHEN to_regclass(part) IS NOT NULL;
+        EXECUTE format('CREATE TABLE %I (LIKE subscriptions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+        EXECUTE format('WITH moved AS (DELETE FROM subscriptions_default WHERE give_date >= %L AND give_date < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM moved', make_date(y, 1, 1), make_date(y + 1, 1, 1), part);
+        EXECUTE format('ALTER TABLE subscriptions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       part, make_date(y, 1, 1), make_date(y + 1, 1, 1));
+        created := created + 1;
+    END LOOP;
+    PERFORM set_config('library.moving_loans', 'off', true);
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Переносит в subscriptions_archive выдачи, возвращенные раньше p_returned_before.
+-- Сводка author_loans_daily их по-прежнему учитывает.
+CREATE OR REPLACE FUNCTION archive_returned_loans(p_returned_before DATE)
+RETURNS BIGINT AS $$
+DECLARE
+    moved_count BIGINT;
+BEGIN
+    PERFORM set_config('library.moving_loans', 'on', true);
+    WITH moved AS (
+        DELETE FROM subscriptions
+        WHERE return_date < p_returned_before
+        RETURNING sub_id, book_id, reader_id, give_date, return_date, prepayment
+    )
+    INSERT INTO subscriptions_archive (sub_id, book_id, reader_id, give_date, return_date, prepayment)
+    SELECT sub_id, book_id, reader_id, give_date, return_date, prepayment FROM moved;
+    GET DIAGNOSTICS moved_count = ROW_COUNT;
+    PERFORM set_config('library.moving_loans', 'off', true);
+    RETURN moved_count;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION update_book_inventory()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF moving_loans() THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.return_date IS NULL THEN
+        IF TG_OP = 'DELETE' OR NEW.return_date IS NOT NULL OR NEW.book_id IS DISTINCT FROM OLD.book_id THEN
+            PERFORM adjust_book_inventory(OLD.book_id, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.return_date IS NULL THEN
+        IF TG_OP = 'INSERT' OR OLD.return_date IS NOT NULL OR NEW.book_id IS DISTINCT FROM OLD.book_id THEN
+            PERFORM adjust_book_inventory(NEW.book_id, 1);
+        END IF;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION report_summaries_on_subscription()
+RETURNS TRIGGER AS $$
+DECLARE
+    book_author VARCHAR;
+BEGIN
+    IF moving_loans() THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT author INTO book_author FROM books WHERE book_id = OLD.book_id;
+        IF FOUND THEN
+            PERFORM adjust_author_loans(book_author, OLD.give_date, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT author INTO book_author FROM books WHERE book_id = NEW.book_id;
+        IF FOUND THEN
+            PERFORM adjust_author_loans(book_author, NEW.give_date, 1);
+        END IF;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Выдачи книги теперь лежат и в subscriptions, и в subscriptions_archive
+CREATE OR REPLACE FUNCTION report_summaries_on_book()
+RETURNS TRIGGER AS $$
+DECLARE
+    loan_day RECORD;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0), NEW.on_loan);
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        PERFORM adjust_library_stats(OLD.library_id, -COALESCE(OLD.quantity, 0), -OLD.on_loan);
+        FOR loan_day IN SELECT give_date, count(*) AS loans
+                        FROM (SELECT give_date FROM subscriptions WHERE book_id = OLD.book_id
+                              UNION ALL
+                              SELECT give_date FROM subscriptions_archive WHERE book_id = OLD.book_id) s
+                        GROUP BY give_date LOOP
+            PERFORM adjust_author_loans(OLD.author, loan_day.give_date, -loan_day.loans);
+        END LOOP;
+        RETURN OLD;
+    END IF;
+
+    IF OLD.library_id IS DISTINCT FROM NEW.library_id THEN
+        PERFORM adjust_library_stats(OLD.library_id, -COALESCE(OLD.quantity, 0), -OLD.on_loan);
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0), NEW.on_loan);
+    ELSE
+        PERFORM adjust_library_stats(NEW.library_id, COALESCE(NEW.quantity, 0) - COALESCE(OLD.quantity, 0), NEW.on_loan - OLD.on_loan);
+    END IF;
+
+    IF OLD.author IS DISTINCT FROM NEW.author THEN
+        FOR loan_day IN SELECT give_date, count(*) AS loans
+                        FROM (SELECT give_date FROM subscriptions WHERE book_id = NEW.book_id
+                              UNION ALL
+                              SELECT give_date FROM subscriptions_archive WHERE book_id = NEW.book_id) s
+                        GROUP BY give_date LOOP
+            PERFORM adjust_author_loans(OLD.author, loan_day.give_date, -loan_day.loans);
+            PERFORM adjust_author_loans(NEW.author, loan_day.give_date, loan_day.loans);
+        END LOOP;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION refresh_report_summaries()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE books, subscriptions, subscriptions_archive IN SHARE MODE;
+
+    DELETE FROM library_stats;
+    INSERT INTO library_stats (library_id, available, on_loan)
+    SELECT l.library_id, COALESCE(SUM(b.quantity), 0), COALESCE(SUM(b.on_loan), 0)
+    FROM libraries l
+    LEFT JOIN books b ON b.library_id = l.library_id
+    GROUP BY l.library_id;
+
+    DELETE FROM author_loans_daily;
+    INSERT INTO author_loans_daily (give_date, author, loans)
+    SELECT s.give_date, b.author, count(*)
+    FROM (SELECT book_id, give_date FROM subscriptions
+          UNION ALL
+          SELECT book_id, give_date FROM subscriptions_archive) s
+    JOIN books b ON b.book_id = s.book_id
+    GROUP BY s.give_date, b.author;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Триггеры старой таблицы удалены вместе с ней; на секционированной
+-- таблице они наследуются всеми секциями.
+DROP TRIGGER IF EXISTS trg_book_issue ON subscriptions;
+CREATE TRIGGER trg_book_issue
+AFTER INSERT OR DELETE OR UPDATE OF book_id, return_date ON subscriptions
+FOR EACH ROW
+EXECUTE FUNCTION update_book_inventory();
+
+DROP TRIGGER IF EXISTS trg_report_summaries_subscription ON subscriptions;
+CREATE TRIGGER trg_report_summaries_subscription
+AFTER INSERT OR DELETE OR UPDATE OF book_id, give_date ON subscriptions
+FOR EACH ROW
+EXECUTE FUNCTION report_summaries_on_subscription();
+
+DROP TRIGGER IF EXISTS trg_notify_subscriptions_insert ON subscriptions;
+CREATE TRIGGER trg_notify_subscriptions_insert AFTER INSERT ON subscriptions
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change('sub_id');
+DROP TRIGGER IF EXISTS trg_notify_subscriptions_update ON subscriptions;
+CREATE TRIGGER trg_notify_subscriptions_update AFTER UPDATE ON subscriptions
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change('sub_id');
+DROP TRIGGER IF EXISTS trg_notify_subscriptions_delete ON subscriptions;
+CREATE TRIGGER trg_notify_subscriptions_delete AFTER DELETE ON subscriptions
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change('sub_id');
+DROP TRIGGER IF EXISTS trg_notify_subscriptions_truncate ON subscriptions;
+CREATE TRIGGER trg_notify_subscriptions_truncate AFTER TRUNCATE ON subscriptions
+FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change('sub_id');
+
+ANALYZE subscriptions;
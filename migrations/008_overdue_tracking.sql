@@ -0,0 +1,168 @@
+-- Сроки возврата и учет просрочек.
+-- subscriptions.due_date заполняется при выдаче по таблице loan_periods:
+-- правило для пары (библиотека, тематика) важнее правила для тематики,
+-- тематика важнее библиотеки, строка без обоих задает общий срок. Изменение
+-- правил не пересчитывает сроки уже выданных книг.
+-- reader_loans_due хранит число и предоплату открытых выдач читателя по
+-- дням возврата и поддерживается триггером; просроченными считаются строки с
+-- due_date < CURRENT_DATE, поэтому сводка не устаревает со сменой дня.
+
+CREATE TABLE IF NOT EXISTS loan_periods (
+    period_id SERIAL PRIMARY KEY,
+    library_id INT REFERENCES libraries(library_id) ON DELETE CASCADE,
+    theme_id INT REFERENCES themes(theme_id) ON DELETE CASCADE,
+    loan_days INT NOT NULL CHECK (loan_days > 0)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_loan_periods_scope ON loan_periods (COALESCE(library_id, 0), COALESCE(theme_id, 0));
+
+INSERT INTO loan_periods (library_id, theme_id, loan_days)
+SELECT NULL, NULL, 30
+WHERE NOT EXISTS (SELECT 1 FROM loan_periods WHERE library_id IS NULL AND theme_id IS NULL);
+
+CREATE OR REPLACE FUNCTION loan_period_days(p_library_id INT, p_theme_id INT)
+RETURNS INT AS $$
+    SELECT COALESCE((SELECT loan_days FROM loan_periods
+                     WHERE (library_id IS NULL OR library_id = p_library_id)
+                       AND (theme_id IS NULL OR theme_id = p_theme_id)
+                     ORDER BY theme_id IS NULL, library_id IS NULL
+                     LIMIT 1), 30)
+$$ LANGUAGE sql STABLE;
+
+
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS due_date DATE;
+ALTER TABLE subscriptions_archive ADD COLUMN IF NOT EXISTS due_date DATE;
+
+CREATE INDEX IF NOT EXISTS idx_subscriptions_open_due ON subscriptions(due_date) WHERE return_date IS NULL;
+
+
+CREATE TABLE IF NOT EXISTS reader_loans_due (
+    reader_id INT NOT NULL,
+    due_date DATE NOT NULL,
+    loans BIGINT NOT NULL DEFAULT 0,
+    prepayment NUMERIC(12,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (reader_id, due_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reader_loans_due_date ON reader_loans_due(due_date);
+
+CREATE OR REPLACE VIEW reader_overdue_summary AS
+SELECT reader_id,
+       SUM(loans) AS overdue_loans,
+       CURRENT_DATE - MIN(due_date) AS max_days_overdue,
+       SUM(prepayment) AS prepayment_at_risk,
+       MAX(updated_at) AS updated_at
+FROM reader_loans_due
+WHERE due_date < CURRENT_DATE
+GROUP BY reader_id;
+
+
+CREATE OR REPLACE FUNCTION adjust_reader_loans(p_reader_id INT, p_due_date DATE, p_loans BIGINT, p_prepayment NUMERIC)
+RETURNS VOID AS $$
+BEGIN
+    IF p_reader_id IS NULL OR p_due_date IS NULL OR p_loans = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO reader_loans_due (reader_id, due_date, loans, prepayment)
+    VALUES (p_reader_id, p_due_date, p_loans, p_prepayment)
+    ON CONFLICT (reader_id, due_date)
+    DO UPDATE SET loans = reader_loans_due.loans + EXCLUDED.loans,
+                  prepayment = reader_loans_due.prepayment + EXCLUDED.prepayment,
+                  updated_at = now();
+    DELETE FROM reader_loans_due WHERE reader_id = p_reader_id AND due_date = p_due_date AND loans <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Срок считается при выдаче и при смене книги или даты выдачи, если его не
+-- задали явно.
+CREATE OR REPLACE FUNCTION set_loan_due_date()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.due_date IS NOT NULL AND (TG_OP = 'INSERT' OR NEW.due_date IS DISTINCT FROM OLD.due_date
+                                     OR (NEW.give_date = OLD.give_date AND NEW.book_id = OLD.book_id)) THEN
+        RETURN NEW;
+    END IF;
+    SELECT NEW.give_date + loan_period_days(b.library_id, b.theme_id)
+    INTO NEW.due_date
+    FROM books b WHERE b.book_id = NEW.book_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reader_loans_on_subscription()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF moving_loans() THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.return_date IS NULL THEN
+        PERFORM adjust_reader_loans(OLD.reader_id, OLD.due_date, -1, -COALESCE(OLD.prepayment, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.return_date IS NULL THEN
+        PERFORM adjust_reader_loans(NEW.reader_id, NEW.due_date, 1, COALESCE(NEW.prepayment, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Заполняет пустые сроки (после загрузки с отключенными триггерами) и
+-- пересчитывает reader_loans_due целиком.
+CREATE OR REPLACE FUNCTION refresh_overdue_tracking()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE subscriptions IN SHARE ROW EXCLUSIVE MODE;
+
+    PERFORM set_config('library.moving_loans', 'on', true);
+    UPDATE subscriptions s
+    SET due_date = s.give_date + loan_period_days(b.library_id, b.theme_id)
+    FROM books b
+    WHERE b.book_id = s.book_id AND s.due_date IS NULL;
+    PERFORM set_config('library.moving_loans', 'off', true);
+
+    DELETE FROM reader_loans_due;
+    INSERT INTO reader_loans_due (reader_id, due_date, loans, prepayment)
+    SELECT reader_id, due_date, count(*), COALESCE(SUM(prepayment), 0)
+    FROM subscriptions
+    WHERE return_date IS NULL AND due_date IS NOT NULL
+    GROUP BY reader_id, due_date;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION archive_returned_loans(p_returned_before DATE)
+RETURNS BIGINT AS $$
+DECLARE
+    moved_count BIGINT;
+BEGIN
+    PERFORM set_config('library.moving_loans', 'on', true);
+    WITH moved AS (
+        DELETE FROM subscriptions
+        WHERE return_date < p_returned_before
+        RETURNING sub_id, book_id, reader_id, give_date, return_date, prepayment, due_date
+    )
+    INSERT INTO subscriptions_archive (sub_id, book_id, reader_id, give_date, return_date, prepayment, due_date)
+    SELECT sub_id, book_id, reader_id, give_date, return_date, prepayment, due_date FROM moved;
+    GET DIAGNOSTICS moved_count = ROW_COUNT;
+    PERFORM set_config('library.moving_loans', 'off', true);
+    RETURN moved_count;
+END;
+$$ LANGUAGE plpgsql;
+
+
+DROP TRIGGER IF EXISTS trg_loan_due_date ON subscriptions;
+CREATE TRIGGER trg_loan_due_date
+BEFORE INSERT OR UPDATE OF book_id, give_date, due_date ON subscriptions
+FOR EACH ROW
+EXECUTE FUNCTION set_loan_due_date();
+
+DROP TRIGGER IF EXISTS trg_reader_loans_subscription ON subscriptions;
+CREATE TRIGGER trg_reader_loans_subscription
+AFTER INSERT OR DELETE OR UPDATE OF reader_id, book_id, give_date, due_date, return_date, prepayment ON subscriptions
+FOR EACH ROW
+EXECUTE FUNCTION reader_loans_on_subscription();
+
+SELECT refresh_overdue_tracking();
+
+ANALYZE subscriptions;
+ANALYZE reader_loans_due;
@@ -0,0 +1,107 @@
+import json
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+SKIPPED_MODULES = {'db_manager', 'query_log', 'query_runner', 'lookup_cache', 'report_cache', 'change_set', 'threading',
+                   'contextlib', 'concurrent.futures.thread'}
+
+
+def describe_caller():
+    frame = sys._getframe(1)
+    while frame:
+        module = frame.f_globals.get('__name__', '')
+        function = frame.f_code.co_name
+        if module not in SKIPPED_MODULES and not function.startswith('<'):
+            owner = frame.f_locals.get('self')
+            if owner is not None:
+                return f"{type(owner).__name__}.{function}"
+            return f"{module}.{function}"
+        frame = frame.f_back
+    return "?"
+
+
+def estimate_size(rows):
+    total = 0
+    for row in rows:
+        for value in row:
+            total += len(value) if isinstance(value, (str, bytes)) else 8
+    return total
+
+
+def normalize_statement(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class QueryRecord:
+    __slots__ = ('statement', 'caller', 'started_at', 'duration_ms', 'rows', 'bytes', 'error', 'plan')
+
+    def __init__(self, statement, caller, started_at, duration_ms, rows, size, error):
+        self.statement = statement
+        self.caller = caller
+        self.started_at = started_at
+        self.duration_ms = duration_ms
+        self.rows = rows
+        self.bytes = size
+        self.error = error
+        self.plan = None
+
+    def as_dict(self):
+        return {
+            'statement': self.statement,
+            'caller': self.caller,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='milliseconds'),
+            'duration_ms': round(self.duration_ms, 3),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'error': self.error,
+        }
+
+
+class QueryLog:
+    def __init__(self, capacity, slow_ms, log_path=None):
+        self.records = deque(maxlen=capacity)
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self.lock = threading.Lock()
+
+    def record(self, statement, caller, started, rows=None, size=0, error=None):
+        duration_ms = (time.perf_counter() - started) * 1000
+        record = QueryRecord(normalize_statement(statement), caller, time.time() - duration_ms / 1000,
+                             duration_ms, rows, size, error)
+        with self.lock:
+            self.records.append(record)
+            if self.log_path:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record.as_dict(), ensure_ascii=False) + "\n")
+        return record
+
+    def is_slow(self, record):
+        return record.error is None and record.duration_ms >= self.slow_ms
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.records)
+
+    def slowest(self, n=20):
+        return sorted(self.snapshot(), key=lambda r: r.duration_ms, reverse=True)[:n]
+
+    def most_frequent(self, n=20):
+        stats = {}
+        for record in self.snapshot():
+            entry = stats.setdefault(record.statement, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                                                        'callers': set()})
+            entry['count'] += 1
+            entry['total_ms'] += record.duration_ms
+            entry['max_ms'] = max(entry['max_ms'], record.duration_ms)
+            entry['rows'] += record.rows or 0
+            entry['callers'].add(record.caller)
+        ordered = sorted(stats.items(), key=lambda item: item[1]['count'], reverse=True)
+        return ordered[:n]
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
\ No newline at end of file
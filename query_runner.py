@@ -0,0 +1,112 @@
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+from db_config import POOL_MAX_CONN
+from query_log import describe_caller
+
+POLL_INTERVAL_MS = 50
+MAX_QUEUED_RESULTS = 8
+MAX_RESULTS_PER_POLL = 4
+
+executor = ThreadPoolExecutor(max_workers=POOL_MAX_CONN, thread_name_prefix="query")
+
+
+class QueryTask:
+    def __init__(self):
+        self.cancelled = False
+        self.conn = None
+        self.caller = describe_caller()
+        self.lock = threading.Lock()
+
+    def attach(self, conn):
+        with self.lock:
+            self.conn = conn
+            if self.cancelled:
+                conn.cancel()
+
+    def detach(self):
+        with self.lock:
+            self.conn = None
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.conn is not None:
+                self.conn.cancel()
+
+
+class QueryRunner:
+    def __init__(self, widget):
+        self.widget = widget
+        self.results = queue.Queue(maxsize=MAX_QUEUED_RESULTS)
+        self.active = set()
+        self.polling = False
+
+    def put(self, task, callback, result, final=True):
+        while not task.cancelled:
+            try:
+                self.results.put((task, callback, result, final), timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def start(self, task, work):
+        self.active.add(task)
+        executor.submit(work)
+        if not self.polling:
+            self.polling = True
+            self.widget.after(POLL_INTERVAL_MS, self.poll)
+
+    def submit(self, func, on_done, on_error=None):
+        task = QueryTask()
+
+        def work():
+            try:
+                self.put(task, on_done, func(task))
+            except Exception as e:
+                self.put(task, on_error, e)
+
+        self.start(task, work)
+        return task
+
+    def submit_stream(self, func, on_batch, on_done, on_error=None):
+        task = QueryTask()
+
+        def work():
+            try:
+                for batch in func(task):
+                    self.put(task, on_batch, batch, final=False)
+                    if task.cancelled:
+                        break
+                self.put(task, on_done, None)
+            except Exception as e:
+                self.put(task, on_error, e)
+
+        self.start(task, work)
+        return task
+
+    def poll(self):
+        try:
+            for _ in range(MAX_RESULTS_PER_POLL):
+                task, callback, result, final = self.results.get_nowait()
+                if final:
+                    self.active.discard(task)
+                if task.cancelled:
+                    continue
+                if callback:
+                    callback(result)
+                elif isinstance(result, Exception):
+                    print(f"Ошибка фонового запроса: {result}")
+        except queue.Empty:
+            pass
+        except tk.TclError:
+            self.polling = False
+            return
+
+        self.active = {task for task in self.active if not task.cancelled}
+        if self.active:
+            self.widget.after(POLL_INTERVAL_MS, self.poll)
+        else:
+            self.polling = False
\ No newline at end of file
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from psycopg2 import sql
+
+MIRRORED_TABLES = ('libraries', 'themes', 'employees')
+PAGED_TABLES = ('books', 'readers')
+MAX_CACHED_PAGES = 500
+TRIGGER_SOURCES = {'books': ('subscriptions',)}
+
+REPLICA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirrors (
+    table_name TEXT PRIMARY KEY,
+    columns TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS page_tables (
+    key TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    PRIMARY KEY (table_name, key)
+);
+CREATE INDEX IF NOT EXISTS idx_pages_table ON pages(table_name);
+CREATE INDEX IF NOT EXISTS idx_pages_fetched ON pages(fetched_at);
+"""
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return {'t': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'n': str(value)}
+    return value
+
+def decode_value(value):
+    if isinstance(value, dict):
+        if 't' in value:
+            return datetime.fromisoformat(value['t'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        return Decimal(value['n'])
+    return value
+
+def encode_rows(rows):
+    return json.dumps([[encode_value(v) for v in row] for row in rows], ensure_ascii=False)
+
+def decode_rows(text):
+    return [tuple(decode_value(v) for v in row) for row in json.loads(text)]
+
+
+def query_tables(table):
+    return (table,) + TRIGGER_SOURCES.get(table, ())
+
+
+def page_key(query, params):
+    text = repr(query) + json.dumps(params, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+# Локально отдаются только страницы без фильтра в порядке первичного ключа:
+# ILIKE и порядок по правилам сортировки базы в Python не воспроизвести.
+def select_rows(rows, columns, output, descending=False, last_pk=None, limit=None):
+    ordered = sorted(rows, key=lambda row: row[0], reverse=descending)
+    if last_pk is not None:
+        ordered = [row for row in ordered if (row[0] < last_pk if descending else row[0] > last_pk)]
+    if limit is not None:
+        ordered = ordered[:limit]
+    indexes = [columns.index(col) for col in output]
+    return [tuple(row[i] for i in indexes) for row in ordered]
+
+
+class ReplicaCache:
+    def __init__(self, db_manager, path, max_age):
+        self.db = db_manager
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(REPLICA_SCHEMA)
+        self.mirrors = {}
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def is_fresh(self, stored_at):
+        return time.time() - stored_at <= self.max_age
+
+    def invalidate(self, tables):
+        with self.lock:
+            for table in tables:
+                self.mirrors.pop(table, None)
+                self.conn.execute("UPDATE mirrors SET synced_at = 0 WHERE table_name = ?", (table,))
+                self.conn.execute("DELETE FROM pages WHERE table_name = ? OR key IN "
+                                  "(SELECT key FROM page_tables WHERE table_name = ?)", (table, table))
+            self.delete_orphan_tables()
+            self.conn.commit()
+
+    def delete_orphan_tables(self):
+        self.conn.execute("DELETE FROM page_tables WHERE key NOT IN (SELECT key FROM pages)")
+
+    def mirror_rows(self, table, task=None):
+        columns = self.db.schema.columns(table)
+        with self.lock:
+            cached = self.mirrors.get(table)
+            if cached is None:
+                stored = self.conn.execute("SELECT columns, rows, synced_at FROM mirrors WHERE table_name = ?",
+                                           (table,)).fetchone()
+                if stored and json.loads(stored[0]) == columns:
+                    cached = self.mirrors[table] = (decode_rows(stored[1]), stored[2])
+            if cached and self.is_fresh(cached[1]):
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        versions = self.db.get_table_versions([table])
+        query = sql.SQL("SELECT {} FROM {}").format(sql.SQL(', ').join(sql.Identifier(c) for c in columns),
+                                                    sql.Identifier(table))
+        rows = self.db.execute_query(query, fetch="all", task=task, prepared=True)
+        if rows is None:
+            return None
+        synced_at = time.time()
+        with self.lock:
+            if versions == self.db.get_table_versions([table]):
+                self.mirrors[table] = (rows, synced_at)
+                self.conn.execute("INSERT OR REPLACE INTO mirrors VALUES (?, ?, ?, ?)",
+                                  (table, json.dumps(columns), encode_rows(rows), synced_at))
+                self.conn.commit()
+        return rows
+
+    def get_page(self, key):
+        with self.lock:
+            stored = self.conn.execute("SELECT rows, fetched_at FROM pages WHERE key = ?", (key,)).fetchone()
+            if stored and self.is_fresh(stored[1]):
+                self.hits += 1
+                return decode_rows(stored[0])
+            self.misses += 1
+            return None
+
+    def put_page(self, key, tables, rows, versions):
+        with self.lock:
+            if versions != self.db.get_table_versions(tables):
+                return
+            self.conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", (key, tables[0], encode_rows(rows), time.time()))
+            self.conn.executemany("INSERT OR IGNORE INTO page_tables VALUES (?, ?)", [(key, table) for table in tables])
+            self.conn.execute("DELETE FROM pages WHERE key IN (SELECT key FROM pages ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                              (MAX_CACHED_PAGES,))
+            self.delete_orphan_tables()
+            self.conn.commit()
+
+    def read(self, table, query, params, fetch, local=None, task=None):
+        if table in MIRRORED_TABLES and local:
+            rows = self.mirror_rows(table, task)
+            if rows is not None:
+                yield local(rows)
+                return
+
+        if table not in PAGED_TABLES:
+            yield from fetch()
+            return
+
+        key = page_key(query, params)
+        rows = self.get_page(key)
+        if rows is not None:
+            yield rows
+            return
+        tables = query_tables(table)
+        versions = self.db.get_table_versions(tables)
+        rows = []
+        for batch in fetch():
+            if batch is None:
+                rows = None
+            elif rows is not None:
+                rows.extend(batch)
+            yield batch
+        if rows is not None and not (task and task.cancelled):
+            self.put_page(key, tables, rows, versions)
+
+    def stats(self):
+        with self.lock:
+            pages = self.conn.execute("SELECT count(*) FROM pages").fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'pages': pages, 'mirrors': len(self.mirrors)}
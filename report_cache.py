@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+REPORT_CACHE_TTL = 300
+REPORT_CACHE_MAX_ENTRIES = 32
+REPORT_CACHE_MAX_ROWS = 100000
+
+
+def normalize_params(params):
+    return tuple(sorted((params or {}).items()))
+
+
+class CacheEntry:
+    __slots__ = ('rows', 'extra', 'versions', 'created_at')
+
+    def __init__(self, rows, extra, versions):
+        self.rows = rows
+        self.extra = extra
+        self.versions = versions
+        self.created_at = time.time()
+
+
+class ReportCache:
+    def __init__(self, ttl=REPORT_CACHE_TTL, max_entries=REPORT_CACHE_MAX_ENTRIES, max_rows=REPORT_CACHE_MAX_ROWS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.entries = OrderedDict()
+        self.total_rows = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, name, params, versions):
+        key = (name, normalize_params(params))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry.versions != versions or time.time() - entry.created_at > self.ttl):
+                self.remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, name, params, versions, rows, extra=None):
+        if len(rows) > self.max_rows:
+            return
+        key = (name, normalize_params(params))
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = CacheEntry(rows, dict(extra or {}), versions)
+            self.total_rows += len(rows)
+            while len(self.entries) > self.max_entries or self.total_rows > self.max_rows:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        self.total_rows -= len(entry.rows)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_rows = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'rows': self.total_rows,
+            }
\ No newline at end of file
@@ -0,0 +1,356 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import psycopg2
+from psycopg2 import sql
+
+from bulk_io import convert_value
+from report_cache import ReportCache
+
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8765
+
+report_cache = ReportCache()
+
+OVERDUE_SORTS = {"Дням просрочки": 'days_overdue DESC', "ФИО читателя": 'r.full_name ASC', "Названию книги": 'b.title ASC'}
+ACTIVITY_SORTS = {"Названию библиотеки": 'l.name', "Всего книг": 'total_books DESC', "Книг на руках": 'on_loan DESC',
+                  "Книг в наличии": 'available DESC'}
+READER_OVERDUE_SORTS = {"Книгам в просрочке": 'o.overdue_loans DESC', "Дням просрочки": 'o.max_days_overdue DESC',
+                        "Предоплате под риском": 'o.prepayment_at_risk DESC', "ФИО читателя": 'r.full_name ASC'}
+
+
+def build_overdue_books_query(params):
+    query = """
+    SELECT r.full_name, b.title, s.give_date, s.due_date, (CURRENT_DATE - s.due_date) AS days_overdue
+    FROM subscriptions s
+    JOIN readers r ON s.reader_id = r.reader_id
+    JOIN books b ON s.book_id = b.book_id
+    WHERE s.return_date IS NULL AND s.due_date < CURRENT_DATE
+    """
+    query_params = []
+    if params['reader_name']:
+        query += " AND r.full_name ILIKE %s"
+        query_params.append(f"%{params['reader_name']}%")
+    query += f" ORDER BY {OVERDUE_SORTS.get(params['sort_by'], '5 DESC')}"
+    return query, tuple(query_params)
+
+def build_reader_overdue_query(params):
+    query = """
+    SELECT r.full_name, o.overdue_loans, o.max_days_overdue, o.prepayment_at_risk
+    FROM reader_overdue_summary o
+    JOIN readers r ON r.reader_id = o.reader_id
+    """
+    query += f" ORDER BY {READER_OVERDUE_SORTS.get(params['sort_by'], '2 DESC')}"
+    return query
+
+POPULAR_AUTHORS_QUERY = """
+    SELECT author, SUM(loans) AS borrow_count
+    FROM author_loans_daily
+    WHERE give_date BETWEEN %s AND %s
+    GROUP BY author ORDER BY borrow_count DESC LIMIT 20
+    """
+
+def build_library_activity_query(params):
+    query = """
+    SELECT l.name, ls.available + ls.on_loan AS total_books, ls.on_loan, ls.available
+    FROM library_stats ls
+    JOIN libraries l ON l.library_id = ls.library_id
+    """
+    query += f" ORDER BY {ACTIVITY_SORTS.get(params['sort_by'], '3 DESC')}"
+    return query
+
+def stream_with_freshness(db, query, params, summary_table, task, freshness):
+    row = db.execute_query(sql.SQL("SELECT MAX(updated_at) FROM {}").format(sql.Identifier(summary_table)),
+                           fetch="one", task=task, prepared=True)
+    if row and row[0]:
+        freshness["Данные обновлены"] = row[0].strftime('%d.%m.%Y %H:%M:%S')
+    yield from db.stream_query(query, params, task=task)
+
+def cached_report(db, name, params, tables, fetch):
+    extra = {}
+
+    def load(task=None, refresh=False):
+        versions = db.get_table_versions(tables)
+        entry = None if refresh else report_cache.get(name, params, versions)
+        if entry:
+            extra.clear()
+            extra.update(entry.extra)
+            extra["Из кэша от"] = datetime.fromtimestamp(entry.created_at).strftime('%d.%m.%Y %H:%M:%S')
+            yield entry.rows
+            return
+
+        extra.clear()
+        rows = []
+        for batch in fetch(task, extra):
+            if rows is not None:
+                rows.extend(batch)
+                if len(rows) > report_cache.max_rows:
+                    rows = None
+            yield batch
+        if rows is not None and not (task and task.cancelled):
+            report_cache.put(name, params, versions, rows, extra)
+
+    return load, extra
+
+
+def parse_choice(value, choices, default):
+    value = value or default
+    if value not in choices:
+        raise ValueError(f"Неизвестная сортировка '{value}', допустимо: {', '.join(choices)}")
+    return value
+
+def parse_date(value, default):
+    if not value:
+        return default
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(convert_value(value.strip(), 'date', None))
+
+
+class Report:
+    def __init__(self, name, title, columns, tables, parse_params, fetch, totals, daily=False, cache_params=None):
+        self.name = name
+        self.title = title
+        self.columns = columns
+        self.tables = tables
+        self.parse_params = parse_params
+        self.fetch = fetch
+        self.totals = totals
+        self.daily = daily
+        self.cache_params = cache_params
+
+    def loader(self, db, params):
+        cache_params = self.cache_params(params) if self.cache_params else params
+        if self.daily:
+            cache_params = {**cache_params, 'on_date': date.today()}
+        return cached_report(db, self.name, cache_params, self.tables,
+                             lambda task, extra: self.fetch(db, params, task, extra))
+
+
+def overdue_books_params(raw):
+    return {'reader_name': (raw.get('reader_name') or '').strip(),
+            'sort_by': parse_choice(raw.get('sort_by'), OVERDUE_SORTS, "Дням просрочки")}
+
+# reader_name ищется через ILIKE, поэтому регистр на результат не влияет.
+def overdue_books_cache_params(params):
+    return {**params, 'reader_name': params['reader_name'].lower()}
+
+def overdue_books_fetch(db, params, task, extra):
+    query, query_params = build_overdue_books_query(params)
+    return db.stream_query(query, query_params, task=task)
+
+def popular_authors_params(raw):
+    today = date.today()
+    params = {'start_date': parse_date(raw.get('start_date'), today.replace(month=1, day=1)),
+              'end_date': parse_date(raw.get('end_date'), today)}
+    if params['start_date'] > params['end_date']:
+        raise ValueError("Начальная дата позже конечной")
+    return params
+
+def popular_authors_fetch(db, params, task, extra):
+    return stream_with_freshness(db, POPULAR_AUTHORS_QUERY, (params['start_date'], params['end_date']),
+                                 'author_loans_daily', task, extra)
+
+def reader_overdue_params(raw):
+    return {'sort_by': parse_choice(raw.get('sort_by'), READER_OVERDUE_SORTS, "Книгам в просрочке")}
+
+def reader_overdue_fetch(db, params, task, extra):
+    return stream_with_freshness(db, build_reader_overdue_query(params), None, 'reader_loans_due', task, extra)
+
+def library_activity_params(raw):
+    return {'sort_by': parse_choice(raw.get('sort_by'), ACTIVITY_SORTS, "Книг на руках")}
+
+def library_activity_fetch(db, params, task, extra):
+    return stream_with_freshness(db, build_library_activity_query(params), None, 'library_stats', task, extra)
+
+
+REPORTS = {report.name: report for report in (
+    Report('overdue_books', "Отчет: Книги-должники",
+           ["ФИО читателя", "Название книги", "Дата выдачи", "Срок возврата", "Дней просрочки"],
+           ('subscriptions', 'readers', 'books'), overdue_books_params, overdue_books_fetch,
+           lambda count, sums, extra: {"Всего книг в просрочке": count, **extra}, daily=True,
+           cache_params=overdue_books_cache_params),
+    Report('reader_overdue', "Отчет: Читатели-должники",
+           ["ФИО читателя", "Книг в просрочке", "Макс. дней просрочки", "Предоплата под риском"],
+           ('subscriptions', 'readers'), reader_overdue_params, reader_overdue_fetch,
+           lambda count, sums, extra: {"Читателей с просрочкой": count, "Книг в просрочке": sums[1],
+                                       "Предоплата под риском": sums[3], **extra}, daily=True),
+    Report('popular_authors', "Отчет: Популярные авторы", ["Автор", "Количество выдач"],
+           ('subscriptions', 'books'), popular_authors_params, popular_authors_fetch,
+           lambda count, sums, extra: {"Всего выдач за период (топ 20 авторов)": sums[1], **extra}),
+    Report('library_activity', "Отчет: Активность библиотек", ["Библиотека", "Всего экз.", "На руках", "В наличии"],
+           ('libraries', 'books', 'subscriptions'), library_activity_params, library_activity_fetch,
+           lambda count, sums, extra: {"Всего книг": sums[1], "Всего на руках": sums[2], "Всего в наличии": sums[3], **extra}),
+)}
+
+
+def run_report(db, name, raw_params, task=None, refresh=False):
+    report = REPORTS.get(name)
+    if report is None:
+        raise ValueError(f"Неизвестный отчет: {name}")
+    load, extra = report.loader(db, report.parse_params(raw_params))
+    return report, load(task, refresh), extra
+
+
+def json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+def write_csv(columns, batches, out):
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        out.flush()
+
+def write_json_lines(columns, batches, out):
+    for batch in batches:
+        for row in batch:
+            out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=json_value) + "\n")
+        out.flush()
+
+WRITERS = {'csv': (write_csv, 'text/csv'), 'jsonl': (write_json_lines, 'application/x-ndjson')}
+
+
+def count_totals(batches, totals):
+    totals['count'] = 0
+    totals['sums'] = defaultdict(int)
+    for batch in batches:
+        for row in batch:
+            for i, value in enumerate(row):
+                if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                    totals['sums'][i] += value
+        totals['count'] += len(batch)
+        yield batch
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False, default=json_value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if parts == ['reports']:
+            self.send_json(200, [{'name': r.name, 'title': r.title, 'columns': r.columns} for r in REPORTS.values()])
+            return
+        if len(parts) != 2 or parts[0] != 'reports':
+            self.send_json(404, {'error': "Не найдено"})
+            return
+
+        output_format = query.pop('format', 'jsonl')
+        refresh = query.pop('refresh', '') in ('1', 'true')
+        if output_format not in WRITERS:
+            self.send_json(400, {'error': f"Неизвестный формат: {output_format}"})
+            return
+        try:
+            report, batches, _ = run_report(self.server.db, parts[1], query, refresh=refresh)
+            first = next(batches, [])
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        except psycopg2.Error as e:
+            self.send_json(500, {'error': str(e).strip()})
+            return
+
+        write, content_type = WRITERS[output_format]
+        self.send_response(200)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.end_headers()
+        out = io.TextIOWrapper(self.wfile, encoding='utf-8', newline='', write_through=True)
+        try:
+            write(report.columns, itertools.chain([first], batches), out)
+        except (psycopg2.Error, OSError) as e:
+            print(f"Отчет {report.name} прерван: {e}", file=sys.stderr)
+        finally:
+            batches.close()
+            out.detach()
+
+
+def serve(db, host=SERVER_HOST, port=SERVER_PORT):
+    server = ThreadingHTTPServer((host, port), ReportRequestHandler)
+    server.daemon_threads = True
+    server.db = db
+    db.listener.start()
+    print(f"Сервер отчетов: http://{host}:{port}/reports", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_param(text):
+    if '=' not in text:
+        raise argparse.ArgumentTypeError(f"ожидалось имя=значение: {text}")
+    return tuple(text.split('=', 1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчеты библиотеки без графического интерфейса.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="список отчетов")
+    run_parser = commands.add_parser("run", help="сформировать отчет")
+    run_parser.add_argument("report", choices=list(REPORTS))
+    run_parser.add_argument("--param", type=parse_param, action="append", default=[], metavar="ИМЯ=ЗНАЧЕНИЕ",
+                            help="параметр отчета: reader_name, sort_by, start_date, end_date")
+    run_parser.add_argument("--format", choices=list(WRITERS), default="csv")
+    run_parser.add_argument("--output", default="-", help="файл результата ('-' для stdout)")
+    serve_parser = commands.add_parser("serve", help="локальный HTTP-сервер отчетов")
+    serve_parser.add_argument("--host", default=SERVER_HOST)
+    serve_parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for report in REPORTS.values():
+            print(f"{report.name}: {report.title}")
+        return 0
+
+    from db_manager import DatabaseManager
+    db = DatabaseManager()
+    if not db.is_connected():
+        return 1
+    try:
+        if args.command == "serve":
+            serve(db, args.host, args.port)
+            return 0
+
+        report, batches, extra = run_report(db, args.report, dict(args.param), refresh=True)
+        totals = {}
+        write, _ = WRITERS[args.format]
+        if args.output == "-":
+            write(report.columns, count_totals(batches, totals), sys.stdout)
+        else:
+            with open(args.output, 'w', newline='', encoding='utf-8') as f:
+                write(report.columns, count_totals(batches, totals), f)
+        for key, value in report.totals(totals['count'], totals['sums'], extra).items():
+            print(f"{key}: {value}", file=sys.stderr)
+    except (ValueError, OSError, psycopg2.Error) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+def sort_key(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+class ResultModel:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.clear()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, iid):
+        return iid in self.positions
+
+    def clear(self):
+        self.data = [[] for _ in self.columns]
+        self.ids = []
+        self.positions = {}
+        self.invalidate()
+
+    def invalidate(self):
+        self.sort_keys = {}
+        self.text_keys = None
+
+    def append(self, iid, row):
+        if iid in self.positions:
+            self.update(iid, row)
+            return
+        self.positions[iid] = len(self.ids)
+        self.ids.append(iid)
+        for values, value in zip(self.data, row):
+            values.append(value)
+        self.invalidate()
+
+    def update(self, iid, row):
+        position = self.positions.get(iid)
+        if position is None:
+            return
+        for values, value in zip(self.data, row):
+            values[position] = value
+        self.invalidate()
+
+    def remove(self, iid):
+        position = self.positions.pop(iid, None)
+        if position is None:
+            return
+        del self.ids[position]
+        for values in self.data:
+            del values[position]
+        for i in range(position, len(self.ids)):
+            self.positions[self.ids[i]] = i
+        self.invalidate()
+
+    def row(self, iid):
+        position = self.positions[iid]
+        return tuple(values[position] for values in self.data)
+
+    def column_keys(self, column):
+        keys = self.sort_keys.get(column)
+        if keys is None:
+            keys = self.sort_keys[column] = [sort_key(v) for v in self.data[self.columns.index(column)]]
+        return keys
+
+    def order(self, column, descending=False):
+        keys = self.column_keys(column)
+        present = [i for i, key in enumerate(keys) if key is not None]
+        missing = [i for i, key in enumerate(keys) if key is None]
+        try:
+            present.sort(key=keys.__getitem__, reverse=descending)
+        except TypeError:
+            present.sort(key=lambda i: str(keys[i]), reverse=descending)
+        return present + missing
+
+    def matching(self, positions, text):
+        if self.text_keys is None:
+            self.text_keys = ["\t".join("" if v is None else str(v).casefold() for v in row) for row in zip(*self.data)]
+        text = text.casefold()
+        return [i for i in positions if text in self.text_keys[i]]
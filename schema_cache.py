@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+
+SCHEMA_CHECK_INTERVAL = 30
+DISPLAY_COLUMN_NAMES = ('title', 'name', 'full_name')
+TEXT_TYPES = ('character varying', 'text', 'character')
+HIDDEN_TYPES = ('tsvector',)
+
+SCHEMA_QUERY = """
+SELECT c.relname,
+       (SELECT json_agg(json_build_object(
+                   'name', a.attname,
+                   'data_type', format_type(a.atttypid, NULL),
+                   'max_length', CASE WHEN a.atttypid IN ('varchar'::regtype, 'bpchar'::regtype) AND a.atttypmod > 0
+                                      THEN a.atttypmod - 4 END,
+                   'not_null', a.attnotnull,
+                   'has_default', a.atthasdef OR a.attidentity <> '' OR a.attgenerated <> '')
+                ORDER BY a.attnum)
+        FROM pg_attribute a
+        WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped) AS columns,
+       (SELECT json_agg(json_build_object(
+                   'type', con.contype,
+                   'name', con.conname,
+                   'columns', ARRAY(SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY k(attnum, ord)
+                                    JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                                    ORDER BY k.ord),
+                   'ref_table', rc.relname,
+                   'ref_columns', ARRAY(SELECT a.attname FROM unnest(con.confkey) WITH ORDINALITY k(attnum, ord)
+                                        JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+                                        ORDER BY k.ord),
+                   'definition', pg_get_constraintdef(con.oid)))
+        FROM pg_constraint con
+        LEFT JOIN pg_class rc ON rc.oid = con.confrelid
+        WHERE con.conrelid = c.oid AND con.contype IN ('p', 'u', 'f', 'c')) AS constraints
+FROM pg_class c
+WHERE c.relnamespace = current_schema()::regnamespace
+  AND c.relkind IN ('r', 'p')
+  AND NOT c.relispartition
+"""
+
+VERSION_QUERY = "SELECT version FROM schema_version"
+
+
+class TableSchema:
+    def __init__(self, name, columns, constraints):
+        self.name = name
+        self.column_info = {col['name']: col for col in columns or []}
+        self.columns = [col['name'] for col in columns or [] if col['data_type'] not in HIDDEN_TYPES]
+        constraints = constraints or []
+        self.primary_key = next((c['columns'] for c in constraints if c['type'] == 'p'), self.columns[:1])
+        self.unique = [c['columns'] for c in constraints if c['type'] == 'u']
+        self.references = {c['columns'][0]: (c['ref_table'], c['ref_columns'][0])
+                           for c in constraints if c['type'] == 'f' and len(c['columns']) == 1}
+        self.checks = [(c['name'], c['definition'], c['columns']) for c in constraints if c['type'] == 'c']
+
+    def data_type(self, column):
+        return self.column_info[column]['data_type']
+
+    def display_column(self):
+        text_columns = [col for col in self.columns
+                        if col not in self.primary_key and self.data_type(col) in TEXT_TYPES]
+        for name in DISPLAY_COLUMN_NAMES:
+            if name in text_columns:
+                return name
+        for col in text_columns:
+            if col.endswith('_name'):
+                return col
+        required = [col for col in text_columns if self.column_info[col]['not_null']]
+        return (required or text_columns or self.primary_key)[0]
+
+
+class SchemaCache:
+    def __init__(self, db_manager, cache_path=None):
+        self.db = db_manager
+        self.cache_path = cache_path
+        self.tables = {}
+        self.version = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def load(self, force=False):
+        with self.lock:
+            version = self.fetch_version()
+            self.checked_at = time.monotonic()
+            if not force and self.tables and version is not None and version == self.version:
+                return True
+            if not force and not self.tables and version is not None and self.load_from_disk(version):
+                return True
+
+            rows = self.db.execute_query(SCHEMA_QUERY, fetch="all")
+            if rows is None:
+                return bool(self.tables)
+            self.tables = {name: TableSchema(name, columns, constraints) for name, columns, constraints in rows}
+            self.version = version
+            self.save_to_disk(rows)
+            return True
+
+    def refresh_if_due(self):
+        if time.monotonic() - self.checked_at > SCHEMA_CHECK_INTERVAL:
+            self.load()
+
+    def invalidate(self):
+        with self.lock:
+            self.tables = {}
+            self.version = None
+
+    def fetch_version(self):
+        row = self.db.execute_query(
+            "SELECT to_regclass('schema_version') IS NOT NULL", fetch="one")
+        if not row or not row[0]:
+            return None
+        row = self.db.execute_query(VERSION_QUERY, fetch="one")
+        return row[0] if row else None
+
+    def cache_key(self):
+        params = self.db.params
+        return f"{params.get('host')}:{params.get('port')}/{params.get('database')}"
+
+    def load_from_disk(self, version):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('key') != self.cache_key() or data.get('version') != version:
+            return False
+        self.tables = {name: TableSchema(name, columns, constraints) for name, columns, constraints in data['tables']}
+        self.version = version
+        return True
+
+    def save_to_disk(self, rows):
+        if not self.cache_path or self.version is None:
+            return
+        try:
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': self.cache_key(), 'version': self.version, 'tables': rows}, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш схемы: {e}")
+
+    def table(self, name):
+        return self.tables.get(name)
+
+    def columns(self, name):
+        table = self.table(name)
+        return list(table.columns) if table else []
+
+    def foreign_keys(self, name):
+        table = self.table(name)
+        if not table:
+            return {}
+        result = {}
+        for col, (ref_table, ref_col) in table.references.items():
+            ref = self.tables.get(ref_table)
+            result[col] = (ref_table, ref_col, ref.display_column() if ref else ref_col)
+        return result
\ No newline at end of file
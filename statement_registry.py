@@ -0,0 +1,143 @@
+import itertools
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
+from psycopg2 import errors, extensions
+
+PLACEHOLDER_RE = re.compile(r'%[s%]')
+
+
+def to_prepared_text(text):
+    numbers = itertools.count(1)
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(0) == '%%':
+            return '%'
+        count = next(numbers)
+        return f"${count}"
+
+    return PLACEHOLDER_RE.sub(replace, text), count
+
+
+def array_literal(values):
+    items = ('NULL' if v is None else '"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+    return "{" + ",".join(items) + "}"
+
+
+class StatementRegistry:
+    def __init__(self, max_per_connection):
+        self.max_per_connection = max_per_connection
+        self.lock = threading.Lock()
+        self.statements = OrderedDict()
+        self.names = itertools.count(1)
+        self.prepared = weakref.WeakKeyDictionary()
+        self.unprepared = set()
+        self.prepares = 0
+        self.executions = 0
+
+    def statement(self, text):
+        with self.lock:
+            entry = self.statements.get(text)
+            if entry is None:
+                entry = self.statements[text] = (f"library_stmt_{next(self.names)}", *to_prepared_text(text))
+                while len(self.statements) > self.max_per_connection:
+                    self.unprepared.discard(self.statements.popitem(last=False)[0])
+            else:
+                self.statements.move_to_end(text)
+            return entry
+
+    def checkout(self, conn, name):
+        with self.lock:
+            self.executions += 1
+            names = self.prepared.setdefault(conn, OrderedDict())
+            if name in names:
+                names.move_to_end(name)
+            return names.get(name)
+
+    def remember(self, conn, name):
+        with self.lock:
+            self.prepares += 1
+            names = self.prepared.setdefault(conn, OrderedDict())
+            names[name] = True
+            evicted = []
+            while len(names) > self.max_per_connection:
+                evicted.append(names.popitem(last=False)[0])
+            return evicted
+
+    def mark_stale(self, conn, name):
+        with self.lock:
+            names = self.prepared.get(conn)
+            if names and name in names:
+                names[name] = False
+
+    def forget(self, conn):
+        with self.lock:
+            self.prepared.pop(conn, None)
+
+    def is_unprepared(self, text):
+        with self.lock:
+            return text in self.unprepared
+
+    def execute(self, cursor, query, params=None):
+        conn = cursor.connection
+        text = query if isinstance(query, str) else query.as_string(conn)
+        name, prepared_text, param_count = self.statement(text)
+        if self.is_unprepared(text):
+            cursor.execute(text, params)
+            return
+        state = self.checkout(conn, name)
+        in_transaction = conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE
+        args = [array_literal(p) if isinstance(p, (list, tuple)) else p for p in params or ()]
+        placeholders = f" ({', '.join(['%s'] * param_count)})" if param_count else ""
+        try:
+            if state is False:
+                cursor.execute(f"DEALLOCATE {name}")
+            if not state and not self.try_prepare(cursor, text, name, prepared_text, in_transaction):
+                cursor.execute(text, params)
+                return
+            cursor.execute(f"EXECUTE {name}{placeholders}", args)
+        except errors.InvalidSqlStatementName:
+            self.forget(conn)
+            raise
+        except errors.FeatureNotSupported:
+            # План устарел после изменения таблицы (cached plan must not change result type).
+            if in_transaction:
+                self.mark_stale(conn, name)
+                raise
+            conn.rollback()
+            cursor.execute(f"DEALLOCATE {name}")
+            self.prepare(cursor, name, prepared_text)
+            cursor.execute(f"EXECUTE {name}{placeholders}", args)
+
+    def try_prepare(self, cursor, text, name, prepared_text, in_transaction):
+        if in_transaction:
+            cursor.execute("SAVEPOINT library_prepare")
+        try:
+            self.prepare(cursor, name, prepared_text)
+        except errors.IndeterminateDatatype:
+            # Тип параметра не выводится ($1 IS NULL, COALESCE($1, ...), $1 в списке выборки):
+            # такой запрос дальше выполняется без PREPARE.
+            if in_transaction:
+                cursor.execute("ROLLBACK TO SAVEPOINT library_prepare")
+            else:
+                cursor.connection.rollback()
+            with self.lock:
+                self.unprepared.add(text)
+            return False
+        if in_transaction:
+            cursor.execute("RELEASE SAVEPOINT library_prepare")
+        return True
+
+    def prepare(self, cursor, name, prepared_text):
+        cursor.execute(f"PREPARE {name} AS {prepared_text}")
+        for old_name in self.remember(cursor.connection, name):
+            cursor.execute(f"DEALLOCATE {old_name}")
+
+    def stats(self):
+        with self.lock:
+            return {'statements': len(self.statements), 'unprepared': len(self.unprepared),
+                    'connections': len(self.prepared), 'prepares': self.prepares, 'executions': self.executions}